@@ -1,5 +1,11 @@
 #! /usr/bin/env python3
+import argparse
+import atexit
+
 import data_utils
+import metrics
+from registry import Registry
+from storage import FLUSH_WINDOW, SYNC_EVERY, open_storage
 """
 author: Imraan Arbab
 date: August 13, 2023
@@ -8,11 +14,36 @@ variety of tasks such as as registering for a course, dropping a course, etc.
 """
 
 def main():
-    # Reading and initializing the data from the csv files
+    parser = argparse.ArgumentParser(description="Saddleback College Registration")
+    parser.add_argument("--database", help="use this SQLite database instead of the csv files")
+    parser.add_argument("--lazy", action="store_true", help="read the registrations when a command first needs them")
+    parser.add_argument("--sync-every", type=int, default=SYNC_EVERY, metavar="N",
+                        help="fsync the students file every N new students, or 0 to sync only on exit")
+    parser.add_argument("--flush-window", type=float, default=FLUSH_WINDOW, metavar="SECONDS",
+                        help="write changes in the background, gathering this many seconds of them per write "
+                             "(csv files only)")
+    parser.add_argument("--check-seats", action="store_true",
+                        help="check the seat counters against registration.csv at startup and rebuild them if they "
+                             "do not match (csv files only)")
+    parser.add_argument("--metrics", action="store_true", help="record timing statistics for the stats command")
+    parser.add_argument("--metrics-dump", metavar="FILE", help="also write the statistics to this JSON file")
+    parser.add_argument("--metrics-interval", type=float, default=60.0, help="seconds between statistics dumps")
+    args = parser.parse_args()
+    if args.flush_window is not None and args.database:
+        parser.error("--flush-window writes the csv files and cannot be used with --database")
+    if args.check_seats and args.database:
+        parser.error("--check-seats reads registration.csv and cannot be used with --database")
+    if args.metrics or args.metrics_dump:
+        metrics.enable(args.metrics_dump, args.metrics_interval)
+
+    # Reading and initializing the data from the csv files (or the database)
     data_utils.display_menu()
-    registration_info = data_utils.read_registrations("registration.csv")
-    courses = data_utils.read_courses("courses.csv")
-    students = data_utils.read_students()
+    storage = open_storage(args.database, args.sync_every, args.flush_window)
+    # New students still waiting for a sync are flushed however the session ends
+    atexit.register(storage.close)
+    registry = Registry.from_storage(storage, data_utils.read_policy(), args.lazy)
+    if args.check_seats:
+        data_utils.check_seat_counts(registry)
 
     while True:
         student_id = input(
@@ -38,22 +69,27 @@ def main():
                 except ValueError:
                     print("Student's name can only contain alphabetic letters and cannot be left blank.")
 
-            data_utils.add(first_name, last_name, students)
+            data_utils.add(first_name, last_name, registry)
         else:
             # Checking to see if the id entered is valid or not
-            data_utils.find(students, student_id)
+            student_id = data_utils.find(registry, student_id)
 
             while True:
                 response = input("Enter your selection: ")
 
                 if response.lower() == "info":
-                    data_utils.info(students, registration_info, student_id, courses)
-                elif response.lower() == "list":
-                    data_utils.list(courses)
+                    data_utils.info(registry, student_id)
+                elif response.lower().split()[:1] == ["list"]:
+                    data_utils.list(registry, response.split()[1:])
                 elif response.lower() == "detail":
-                    data_utils.detail(courses, registration_info, students)
+                    data_utils.detail(registry)
                 elif response.lower() == "register":
-                    data_utils.register(students, student_id, registration_info, courses)
+                    data_utils.register(registry, student_id)
+                elif response.lower() == "stats":
+                    print()
+                    for line in metrics.report_lines():
+                        print(line)
+                    print()
                 elif response.lower() == "menu":
                     print()
                     data_utils.display_menu1()
@@ -62,7 +98,7 @@ def main():
                     return
                 elif response.lower() == "drop":
                     print()
-                    data_utils.drop(students, student_id, registration_info, courses)
+                    data_utils.drop(registry, student_id)
                 else:
                     print("Invalid selection, please try again.")
                     print()
@@ -0,0 +1,227 @@
+#! /usr/bin/env python3
+"""
+desc: This module computes the enrollment reports the registrar used to build by running info and detail over
+every student and course: the fill rate of every course, the load of every instructor, the distribution of the
+units students are registered for and the courses that are nearly full. The courses and registrations are loaded
+once into columns (arrays of course positions, student positions, units and capacities), and every report is a
+pass over the columns that counts or sums by position. NumPy is used for the passes when it is installed; otherwise
+they run on the standard library's array and Counter. The reports are written as JSON, or as one tab-separated
+file per report:
+
+    python analytics.py report.json
+    python analytics.py reports --format csv --near-capacity 0.8
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from array import array
+from collections import Counter
+
+import data_utils
+from storage import open_storage
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The fill rate from which a course is reported as nearly full
+NEAR_CAPACITY = 0.9
+REPORTS = ("fill_rates", "instructor_load", "unit_distribution", "near_capacity")
+
+
+def bincount(positions, length, weights=None):
+    """
+    This counts the positions, or sums the weights by position
+    :param positions: This is an array of positions, each less than length
+    :param length: This is the number of positions
+    :param weights: This is an array of the weight of each position in positions, or None to count them
+    :return: The list of the count (or the sum of the weights) of every position
+    """
+    if numpy is not None:
+        return numpy.bincount(numpy.asarray(positions, dtype=numpy.intp),
+                              None if weights is None else numpy.asarray(weights), length).tolist()
+    totals = [0] * length
+    if weights is None:
+        for position, count in Counter(positions).items():
+            totals[position] = count
+    else:
+        for position, weight in zip(positions, weights):
+            totals[position] += weight
+    return totals
+
+
+def take(values, positions):
+    """
+    This picks values by position
+    :param values: This is an array of values
+    :param positions: This is an array of positions in values
+    :return: The array of the value at every position
+    """
+    if numpy is not None:
+        return numpy.asarray(values)[numpy.asarray(positions, dtype=numpy.intp)]
+    return array(values.typecode, map(values.__getitem__, positions))
+
+
+class Enrollment:
+    """
+    This holds the courses and registrations as columns: one entry per course, and one per registration holding
+    the position of its course and of its student
+    """
+
+    def __init__(self, students, courses, registrations, policy=None):
+        """
+        :param students: This is the list of the students, so students with no registrations are counted
+        :param courses: This is the list of the courses
+        :param registrations: This is the list of registration records
+        :param policy: This is the Policy holding the seat capacities
+        """
+        policy = policy if policy is not None else data_utils.read_policy()
+        self.courses = courses
+        self.capacities = array("l", (policy.capacity(course.course_id) for course in courses))
+        self.units = array("d", (course.credit_hours for course in courses))
+        self.instructors = sorted({course.instructor for course in courses})
+        instructor_positions = {instructor: position for position, instructor in enumerate(self.instructors)}
+        self.course_instructors = array("l", (instructor_positions[course.instructor] for course in courses))
+
+        course_positions = {course.course_id: position for position, course in enumerate(courses)}
+        student_positions = {student.student_id: position for position, student in enumerate(students)}
+        self.registration_courses = array("l")
+        self.registration_students = array("l")
+        for registration in registrations:
+            course_position = course_positions.get(registration.course_id)
+            if course_position is None:
+                continue
+            student_position = student_positions.setdefault(registration.student_id, len(student_positions))
+            self.registration_courses.append(course_position)
+            self.registration_students.append(student_position)
+        self.student_count = len(student_positions)
+
+    @classmethod
+    def from_storage(cls, storage, policy=None):
+        """
+        This loads the columns from a storage backend
+        :param storage: This is the storage backend
+        :param policy: This is the Policy holding the seat capacities
+        :return: The Enrollment
+        """
+        return cls(*storage.load(), policy)
+
+    def enrolled(self):
+        """
+        :return: The list of the number of students registered for every course
+        """
+        return bincount(self.registration_courses, len(self.courses))
+
+    def student_units(self):
+        """
+        :return: The list of the units every student is registered for
+        """
+        return bincount(self.registration_students, self.student_count,
+                        take(self.units, self.registration_courses))
+
+    def fill_rates(self):
+        """
+        This reports the seats taken in every course
+        :return: The list of rows, one per course
+        """
+        enrolled = self.enrolled()
+        return [{"ticket": course.course_id, "code": course.course_code, "instructor": course.instructor,
+                 "enrolled": enrolled[position], "capacity": capacity,
+                 "fill_rate": round(enrolled[position] / capacity, 4) if capacity else 0.0}
+                for position, (course, capacity) in enumerate(zip(self.courses, self.capacities))]
+
+    def instructor_load(self):
+        """
+        This reports the sections, students and units of every instructor
+        :return: The list of rows, one per instructor
+        """
+        enrolled = array("d", self.enrolled())
+        length = len(self.instructors)
+        sections = bincount(self.course_instructors, length)
+        students = bincount(self.course_instructors, length, enrolled)
+        units = bincount(self.course_instructors, length, self.units)
+        student_units = bincount(self.course_instructors, length,
+                                 array("d", map(float.__mul__, enrolled, self.units)))
+        return [{"instructor": instructor, "sections": sections[position], "students": int(students[position]),
+                 "units": round(units[position], 2), "student_units": round(student_units[position], 2)}
+                for position, instructor in enumerate(self.instructors)]
+
+    def unit_distribution(self):
+        """
+        This reports how many students are registered for each number of units
+        :return: The list of rows, by number of units
+        """
+        counts = Counter(round(units, 2) for units in self.student_units())
+        return [{"units": units, "students": counts[units]} for units in sorted(counts)]
+
+    def near_capacity(self, threshold=NEAR_CAPACITY):
+        """
+        This reports the courses whose fill rate is at least the threshold, fullest first
+        :param threshold: This is the fill rate from which a course is reported
+        :return: The list of rows, one per course
+        """
+        rows = [row for row in self.fill_rates() if row["fill_rate"] >= threshold]
+        return sorted(rows, key=lambda row: (-row["fill_rate"], row["ticket"]))
+
+    def report(self, threshold=NEAR_CAPACITY):
+        """
+        This computes every report
+        :param threshold: This is the fill rate from which a course is reported as nearly full
+        :return: A dictionary of report name -> list of rows
+        """
+        return {"fill_rates": self.fill_rates(), "instructor_load": self.instructor_load(),
+                "unit_distribution": self.unit_distribution(), "near_capacity": self.near_capacity(threshold)}
+
+
+def write_csv(report, directory):
+    """
+    This writes every report to a tab-separated file named after it, with a header row
+    :param report: This is the dictionary of report name -> list of rows
+    :param directory: This is the directory to write the files to
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, rows in report.items():
+        with open(os.path.join(directory, f"{name}.csv"), "w", newline="") as file:
+            writer = csv.writer(file, delimiter="\t", lineterminator="\n")
+            if rows:
+                writer.writerow(rows[0])
+                writer.writerows(row.values() for row in rows)
+
+
+def write_json(report, file):
+    """
+    This writes the reports as one JSON document
+    :param report: This is the dictionary of report name -> list of rows
+    :param file: This is the open file to write to
+    """
+    json.dump(report, file, indent=2)
+    file.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrollment analytics reports")
+    parser.add_argument("output", help="JSON file (- for standard output), or directory for --format csv")
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    parser.add_argument("--near-capacity", type=float, default=NEAR_CAPACITY, metavar="RATE",
+                        help="fill rate from which a course is reported as nearly full")
+    parser.add_argument("--database", help="use this SQLite database instead of the csv files")
+    args = parser.parse_args()
+
+    storage = open_storage(args.database)
+    enrollment = Enrollment.from_storage(storage)
+    storage.close()
+    report = enrollment.report(args.near_capacity)
+    if args.format == "csv":
+        write_csv(report, args.output)
+    elif args.output == "-":
+        write_json(report, sys.stdout)
+    else:
+        with open(args.output, "w") as file:
+            write_json(report, file)
+
+
+if __name__ == "__main__":
+    main()
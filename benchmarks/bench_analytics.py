@@ -0,0 +1,75 @@
+#! /usr/bin/env python3
+"""
+desc: This benchmark compares the enrollment reports of analytics.py with the loop they replace, which runs detail
+for every course and info for every student and adds up the seats and units from the registry. Both are checked
+to give the same enrolled counts and unit totals. The columnar times are split into loading the columns and
+computing every report; the loop is timed after the registry is loaded.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+import data_utils
+from generate_data import generate
+from registry import Registry
+from storage import CsvStorage
+
+
+def loop_report(registry):
+    """
+    This is the report as the registrar built it: one detail per course and one info per student
+    :param registry: This is the registry
+    :return: A tuple of (enrolled count by ticket, units by student id)
+    """
+    enrolled = {}
+    for course in registry.courses:
+        data_utils.detail_lines(registry, course)
+        enrolled[course.course_id] = len(registry.course_students(course.course_id))
+    units = {}
+    for student in registry.students:
+        data_utils.info_lines(registry, student.student_id)
+        units[student.student_id] = sum(course.credit_hours for course in registry.student_courses(student.student_id))
+    return enrolled, units
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the columnar enrollment reports against the loop")
+    parser.add_argument("--students", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--courses", type=int, default=2_000)
+    parser.add_argument("--enrollments", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"NumPy: {'yes' if analytics.numpy is not None else 'no'}")
+    print(f"{'students':>10}{'columns load s':>16}{'reports s':>11}{'loop s':>9}{'speedup':>9}")
+    for students in args.students:
+        with tempfile.TemporaryDirectory() as directory:
+            generate(directory, students, args.courses, args.enrollments, args.seed)
+            os.chdir(directory)
+            policy = data_utils.read_policy()
+
+            start = time.perf_counter()
+            enrollment = analytics.Enrollment.from_storage(CsvStorage(snapshot_path=None), policy)
+            loaded = time.perf_counter()
+            report = enrollment.report()
+            columnar = time.perf_counter() - loaded
+
+            registry = Registry.from_storage(CsvStorage(snapshot_path=None), policy)
+            start_loop = time.perf_counter()
+            enrolled, units = loop_report(registry)
+            looped = time.perf_counter() - start_loop
+
+            assert {row["ticket"]: row["enrolled"] for row in report["fill_rates"]} == enrolled
+            student_units = enrollment.student_units()
+            assert all(abs(student_units[position] - units[student.student_id]) < 1e-6
+                       for position, student in enumerate(registry.students))
+            print(f"{students:>10}{loaded - start:>16.3f}{columnar:>11.3f}{looped:>9.3f}{looped / columnar:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#! /usr/bin/env python3
+"""
+desc: This benchmark measures registration throughput with schedule conflict checking off and on, and the cost of
+the conflict check alone with the interval index the registry uses and with a naive pairwise comparison of every
+meeting of the new course against every meeting of the student's courses, at a few schedule sizes. Seat and unit
+limits are lifted so every attempt reaches the conflict check.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_utils
+from generate_data import generate
+from policy import Policy
+from registry import Registry
+from storage import CsvStorage
+
+
+def pairwise_conflict(registry, student_id, course):
+    """
+    This is the check the interval index replaces: every meeting against every meeting
+    :param registry: This is the registry holding the registrations
+    :param student_id: This is the student id
+    :param course: This is the course record
+    :return: The course id of a conflicting course, or None if there is no conflict
+    """
+    for registered in registry.student_courses(student_id):
+        for day, start, end in registered.meetings:
+            for new_day, new_start, new_end in course.meetings:
+                if day == new_day and start < new_end and new_start < end:
+                    return registered.course_id
+    return None
+
+
+def bench_checks(registry, pairs, check):
+    """
+    This times the conflict check alone
+    :param registry: This is the registry
+    :param pairs: This is the list of (student_id, ticket number) to check
+    :param check: This is 'index' or 'pairwise'
+    :return: The checks per second
+    """
+    courses = [(student_id, registry.course(ticket_number)) for student_id, ticket_number in pairs]
+    start = time.perf_counter()
+    if check == "index":
+        for student_id, course in courses:
+            registry.schedule(student_id).conflict(course)
+    else:
+        for student_id, course in courses:
+            pairwise_conflict(registry, student_id, course)
+    return len(pairs) / (time.perf_counter() - start)
+
+
+def bench_registrations(registry, pairs, check_conflicts):
+    """
+    This times registering every pair and then drops the ones that were accepted, so each run starts from the
+    same registrations
+    :param registry: This is the registry
+    :param pairs: This is the list of (student_id, ticket number) to register
+    :param check_conflicts: This is True to check schedule conflicts
+    :return: A tuple of (registrations attempted per second, fraction accepted)
+    """
+    registry.policy.check_conflicts = check_conflicts
+    accepted = []
+    start = time.perf_counter()
+    for student_id, ticket_number in pairs:
+        if data_utils.register_course(registry, student_id, ticket_number)[0]:
+            accepted.append((student_id, int(ticket_number)))
+    elapsed = time.perf_counter() - start
+    for student_id, course_id in accepted:
+        registry.remove_registration(student_id, course_id)
+    return len(pairs) / elapsed, len(accepted) / len(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure registration throughput with conflict checking")
+    parser.add_argument("--students", type=int, default=10_000)
+    parser.add_argument("--courses", type=int, default=2_000)
+    parser.add_argument("--enrollments", type=int, nargs="+", default=[3, 10, 30], help="courses per student")
+    parser.add_argument("--operations", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'courses/student':>16}{'register off/s':>16}{'register on/s':>15}{'accepted on':>13}"
+          f"{'index checks/s':>16}{'pairwise checks/s':>19}")
+    for enrollments in args.enrollments:
+        with tempfile.TemporaryDirectory() as directory:
+            student_ids, course_ids = generate(directory, args.students, args.courses, enrollments, args.seed)
+            os.chdir(directory)
+            registry = Registry.from_storage(CsvStorage(), Policy(course_capacity=10 ** 9, unit_limit=10 ** 9))
+            # The registry is only measured in memory
+            registry.storage = None
+            rng = random.Random(args.seed)
+            pairs = [(rng.choice(student_ids), str(rng.choice(course_ids))) for _ in range(args.operations)]
+            # The first run builds the schedule cache, so it is not measured
+            bench_registrations(registry, pairs, False)
+            unchecked, _ = bench_registrations(registry, pairs, False)
+            checked, accepted = bench_registrations(registry, pairs, True)
+            index = bench_checks(registry, pairs, "index")
+            pairwise = bench_checks(registry, pairs, "pairwise")
+            print(f"{enrollments:>16}{unchecked:>16.0f}{checked:>15.0f}{accepted:>13.1%}{index:>16.0f}{pairwise:>19.0f}")
+
+
+if __name__ == "__main__":
+    main()
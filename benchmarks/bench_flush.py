@@ -0,0 +1,70 @@
+#! /usr/bin/env python3
+"""
+desc: This benchmark measures register/drop throughput with every change appended to the journal as it is saved
+(without an fsync), and with the background flusher at a few flush windows, where every write is fsynced and holds
+all the changes of its window. The time includes closing the storage, so every change is on disk when the clock
+stops.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_utils
+from generate_data import generate
+from policy import Policy
+from registry import Registry
+from storage import CsvStorage
+
+
+def bench(directory, flush_window, operations, args):
+    """
+    This times registering and dropping random pairs
+    :param directory: This is the directory to write the csv files to
+    :param flush_window: This is the flush window of the storage, or None to write every change as it is saved
+    :param operations: This is the number of registrations and drops
+    :param args: This is the parsed command line
+    :return: A tuple of (changes per second, number of writes)
+    """
+    student_ids, course_ids = generate(directory, args.students, args.courses, 0, args.seed)
+    os.chdir(directory)
+    storage = CsvStorage(flush_window=flush_window)
+    registry = Registry.from_storage(storage, Policy(course_capacity=10 ** 9, unit_limit=10 ** 9,
+                                                     check_conflicts=False))
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    for _ in range(operations // 2):
+        student_id, course_id = rng.choice(student_ids), rng.choice(course_ids)
+        data_utils.register_course(registry, student_id, course_id)
+        data_utils.drop_course(registry, student_id, course_id)
+    flusher = storage.flusher
+    # Closing writes what is still queued, so the writes are counted afterwards
+    storage.close()
+    elapsed = time.perf_counter() - start
+    return operations / elapsed, flusher.flushes if flusher is not None else operations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure register/drop throughput with the background flusher")
+    parser.add_argument("--students", type=int, default=10_000)
+    parser.add_argument("--courses", type=int, default=500)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0.0, 0.001, 0.01, 0.1],
+                        help="flush windows in seconds")
+    parser.add_argument("--operations", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'flush window':>14}{'changes/s':>12}{'writes':>9}{'changes/write':>15}")
+    for flush_window in [None, *args.windows]:
+        with tempfile.TemporaryDirectory() as directory:
+            rate, flushes = bench(directory, flush_window, args.operations, args)
+        label = "every change" if flush_window is None else f"{flush_window * 1000:g} ms"
+        print(f"{label:>14}{rate:>12.0f}{flushes:>9}{args.operations / flushes:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
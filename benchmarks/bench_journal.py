@@ -0,0 +1,86 @@
+#! /usr/bin/env python3
+"""
+desc: This benchmark compares the per-operation write cost of rewriting registration.csv on every change with
+saving the change through CsvStorage, which appends it to the registration journal and compacts the journal (and
+writes the binary snapshot) once it has grown as large as registration.csv. The journal is timed over enough
+changes to go through compactions, so its cost per operation includes them and stays flat as the number of
+registrations grows.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_utils
+from records import Registration
+from registry import Registry
+from storage import CsvStorage
+
+SIZES = [10_000, 100_000, 1_000_000]
+REWRITE_OPERATIONS = 20
+# The journal is timed over this many times the number of registrations, so every run compacts at least once
+JOURNAL_OPERATIONS_PER_REGISTRATION = 2
+
+
+def build_registry(size):
+    """
+    This writes the csv files with the given number of synthetic registrations and loads a registry from them
+    :param size: This is the number of registrations
+    :return: The registry, saving to CsvStorage
+    """
+    for file_path in os.listdir():
+        os.remove(file_path)
+    data_utils.write_students([])
+    data_utils.write_registrations([Registration(f"s{i // 3}", 10000 + i % 500) for i in range(size)])
+    open(data_utils.COURSES_FILENAME, "w").close()
+    return Registry.from_storage(CsvStorage())
+
+
+def bench_rewrite(registry):
+    """
+    This times a register followed by a full rewrite of registration.csv
+    :param registry: This is the registry being written
+    :return: The average seconds per operation
+    """
+    start = time.perf_counter()
+    for i in range(REWRITE_OPERATIONS):
+        registry.add_registration("bench", 90000 + i)
+        data_utils.write_registrations(registry.registrations)
+    return (time.perf_counter() - start) / REWRITE_OPERATIONS
+
+
+def bench_journal(registry, operations):
+    """
+    This times a register followed by saving it through the storage, compactions included
+    :param registry: This is the registry being written
+    :param operations: This is the number of registrations
+    :return: A tuple of (average seconds per operation, number of compactions)
+    """
+    storage = registry.storage
+    compactions = 0
+    start = time.perf_counter()
+    for i in range(operations):
+        registry.add_registration("bench", 90000 + i)
+        # Every compaction recomputes the threshold from the rewritten file, which has grown since the last one
+        compact_size = storage.compact_size
+        storage.save_registration(registry, "+", "bench", 90000 + i)
+        compactions += storage.compact_size != compact_size
+    elapsed = time.perf_counter() - start
+    storage.close()
+    return elapsed / operations, compactions
+
+
+def main():
+    print(f"{'registrations':>14}{'rewrite us/op':>16}{'journal us/op':>16}{'compactions':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        for size in SIZES:
+            rewrite = bench_rewrite(build_registry(size))
+            journal, compactions = bench_journal(build_registry(size), JOURNAL_OPERATIONS_PER_REGISTRATION * size)
+            print(f"{size:>14}{rewrite * 1e6:>16.1f}{journal * 1e6:>16.1f}{compactions:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+"""
+desc: This benchmark measures the memory and scan speed of 1M registrations held as the dictionaries
+read_registrations used to build versus the slotted Registration records, and of the registry built from them.
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import Registration
+from registry import Registry
+
+
+def as_dicts(size):
+    """
+    This builds the registrations the way read_registrations used to, one dictionary per row
+    :param size: This is the number of registrations
+    :return: The list of dictionaries
+    """
+    return [{'student_id': f"s{i // 3}", 'course_id': 10000 + i % 500} for i in range(size)]
+
+
+def as_records(size):
+    """
+    This builds the registrations as slotted records with interned student ids
+    :param size: This is the number of registrations
+    :return: The list of records
+    """
+    return [Registration(f"s{i // 3}", 10000 + i % 500) for i in range(size)]
+
+
+def measure(build, size):
+    """
+    This measures the memory held by what build returns
+    :param build: This is the function that builds the rows
+    :param size: This is the number of registrations
+    :return: A tuple of (the rows, bytes held, build seconds)
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = build(size)
+    elapsed = time.perf_counter() - start
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return rows, held, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare registration dictionaries with slotted records")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    dicts, dict_bytes, dict_build = measure(as_dicts, args.size)
+    start = time.perf_counter()
+    dict_scan = sum(1 for registration in dicts if registration['course_id'] == 10001)
+    dict_scan_time = time.perf_counter() - start
+    del dicts
+
+    records, record_bytes, record_build = measure(as_records, args.size)
+    start = time.perf_counter()
+    record_scan = sum(1 for registration in records if registration.course_id == 10001)
+    record_scan_time = time.perf_counter() - start
+    assert dict_scan == record_scan
+
+    _, registry_bytes, registry_build = measure(lambda size: Registry([], [], records), args.size)
+
+    print(f"{args.size} registrations")
+    print(f"{'':>22}{'MiB':>10}{'build s':>10}{'scan ms':>10}")
+    print(f"{'dictionaries':>22}{dict_bytes / 2 ** 20:>10.1f}{dict_build:>10.2f}{dict_scan_time * 1000:>10.1f}")
+    print(f"{'Registration records':>22}{record_bytes / 2 ** 20:>10.1f}{record_build:>10.2f}"
+          f"{record_scan_time * 1000:>10.1f}")
+    print(f"{'Registry indexes':>22}{registry_bytes / 2 ** 20:>10.1f}{registry_build:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#! /usr/bin/env python3
+"""
+desc: This benchmark measures the time to the first prompt (loading the registry) at 10k, 100k and 1M
+registrations, with the registrations loaded eagerly and in lazy mode, and the cost of the first command that
+needs them in lazy mode, and the time to the first prompt when the binary snapshot of the csv files is loaded
+instead of the csv files. The students and courses files are kept the same size so only registration.csv grows.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_utils
+import snapshot
+from registry import Registry
+from storage import CsvStorage
+
+STUDENTS = 10_000
+
+
+def write_files(size):
+    """
+    This writes synthetic students, courses and registrations csv files in the working directory
+    :param size: This is the number of registrations
+    """
+    with open(data_utils.FILENAME, "w") as file:
+        for i in range(STUDENTS):
+            file.write(f"s{i}\tLast{i}\tFirst{i}\n")
+    with open(data_utils.COURSES_FILENAME, "w") as file:
+        for i in range(500):
+            file.write(f"{10000 + i}\tCIM {i}\tCourse {i}\t3.0\tOnline\t\tStaff\n")
+    with open(data_utils.REGISTRATION_FILENAME, "w") as file:
+        for i in range(size):
+            file.write(f"s{i % STUDENTS}\t{10000 + i // STUDENTS % 500}\n")
+
+
+def startup(lazy, snapshot_path=None):
+    """
+    This times building the registry the way FinalProject does before its first prompt
+    :param lazy: This is True to defer loading the registrations
+    :param snapshot_path: The path to the binary snapshot, or None to parse the csv files
+    :return: A tuple of (the registry, seconds)
+    """
+    start = time.perf_counter()
+    storage = CsvStorage(snapshot_path=snapshot_path)
+    registry = Registry.from_storage(storage, data_utils.read_policy(), lazy)
+    elapsed = time.perf_counter() - start
+    storage.close()
+    return registry, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time to the first prompt")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'registrations':>14}{'eager s':>10}{'lazy s':>10}{'lazy first info s':>20}{'snapshot s':>12}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            write_files(size)
+            _, eager = startup(False)
+            registry, lazy = startup(True)
+            start = time.perf_counter()
+            data_utils.info_lines(registry, "s0")
+            first_command = time.perf_counter() - start
+            snapshot.write_snapshot(registry.students, registry.courses, registry.registrations)
+            # Only one registry is kept alive at a time, as in the other runs
+            del registry
+            _, from_snapshot = startup(False, snapshot.SNAPSHOT_FILENAME)
+            print(f"{size:>14}{eager:>10.3f}{lazy:>10.3f}{first_command:>20.3f}{from_snapshot:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#! /usr/bin/env python3
+"""
+desc: This benchmark compares the csv and SQLite storage backends: how long it takes to load the registrations,
+and how long a single register/drop takes to save, at 10k, 100k and 1M registrations.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_utils
+from records import Course, Registration, Student
+from registry import Registry
+from storage import CsvStorage, SqliteStorage
+
+OPERATIONS = 1_000
+
+
+def synthetic_rows(size):
+    """
+    This builds synthetic students, courses and registrations
+    :param size: This is the number of registrations
+    :return: A tuple of (students, courses, registrations)
+    """
+    students = [Student(f"s{i}", f"Last{i}", f"First{i}") for i in range(size // 3 + 1)]
+    courses = [Course(10000 + i, f"CIM {i}", f"Course {i}", 3.0, "Online", "", "Staff") for i in range(500)]
+    registrations = [Registration(f"s{i // 3}", 10000 + i % 500) for i in range(size)]
+    return students, courses, registrations
+
+
+def write_csv(students, courses, registrations):
+    """
+    This writes the rows as tab-separated csv files in the working directory
+    """
+    data_utils.write_students(students)
+    with open(data_utils.COURSES_FILENAME, "w") as file:
+        for course in courses:
+            file.write(f"{course.course_id}\t{course.course_code}\t{course.course_name}\t"
+                       f"{course.credit_hours}\t{course.day}\t{course.time}\t{course.instructor}\n")
+    data_utils.write_registrations(registrations)
+
+
+def bench(storage):
+    """
+    This times loading the storage and saving register/drop pairs to it
+    :param storage: This is the storage backend
+    :return: A tuple of (load seconds, average seconds per saved operation)
+    """
+    start = time.perf_counter()
+    registry = Registry.from_storage(storage)
+    loaded = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(OPERATIONS // 2):
+        registry.add_registration("bench", 90000 + i)
+        registry.save_registration("+", "bench", 90000 + i)
+        registry.remove_registration("bench", 90000 + i)
+        registry.save_registration("-", "bench", 90000 + i)
+    saved = (time.perf_counter() - start) / OPERATIONS
+    storage.close()
+    return loaded, saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the csv and SQLite storage backends")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'registrations':>14}{'csv load s':>12}{'sqlite load s':>15}{'csv us/op':>12}{'sqlite us/op':>14}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            rows = synthetic_rows(size)
+            write_csv(*rows)
+            database = SqliteStorage("registration.db")
+            database.import_rows(*rows)
+            database.close()
+            csv_load, csv_op = bench(CsvStorage())
+            sqlite_load, sqlite_op = bench(SqliteStorage("registration.db"))
+            print(f"{size:>14}{csv_load:>12.2f}{sqlite_load:>15.2f}{csv_op * 1e6:>12.1f}{sqlite_op * 1e6:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#! /usr/bin/env python3
+"""
+desc: This benchmark measures drop throughput under heavy churn on full courses with long waitlists. Every drop
+promotes the next student from the waitlist, and the dropped student registers again and joins the back of the
+waitlist, so the waitlists keep their length. It runs at a few waitlist lengths, in memory and with the drops and
+promotions journaled by CsvStorage, to show that promotion does not slow down as the waitlists grow.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_utils
+from generate_data import generate
+from policy import Policy
+from registry import Registry
+from storage import CsvStorage
+
+
+def build_registry(directory, courses, capacity, waiting, seed):
+    """
+    This generates a term where every course is full and has a waitlist
+    :param directory: This is the directory to write the csv files to
+    :param courses: This is the number of courses
+    :param capacity: This is the number of seats in every course
+    :param waiting: This is the number of students on every waitlist
+    :param seed: This is the random seed
+    :return: The registry
+    """
+    students = courses * (capacity + waiting)
+    student_ids, course_ids = generate(directory, students, courses, 0, seed)
+    os.chdir(directory)
+    registry = Registry.from_storage(CsvStorage(snapshot_path=None),
+                                     Policy(course_capacity=capacity, unit_limit=10 ** 9, check_conflicts=False))
+    pairs = [(student_id, course_ids[i % courses]) for i, student_id in enumerate(student_ids)]
+    data_utils.register_many(registry, pairs)
+    return registry
+
+
+def bench(registry, operations, rng):
+    """
+    This times drops of random registered students, each followed by the student registering again
+    :param registry: This is the registry
+    :param operations: This is the number of drops
+    :param rng: This is the random number generator
+    :return: A tuple of (drops per second, promotions per drop)
+    """
+    course_ids = [course.course_id for course in registry.courses]
+    promotions = 0
+    start = time.perf_counter()
+    for _ in range(operations):
+        course_id = rng.choice(course_ids)
+        student_id = rng.choice([*registry.registrations_by_course[course_id]])
+        _, message = data_utils.drop_course(registry, student_id, course_id)
+        promotions += message.count("from the waitlist")
+        data_utils.register_course(registry, student_id, course_id)
+    return operations / (time.perf_counter() - start), promotions / operations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure waitlist promotion under drop churn")
+    parser.add_argument("--courses", type=int, default=100)
+    parser.add_argument("--capacity", type=int, default=15)
+    parser.add_argument("--waiting", type=int, nargs="+", default=[10, 100, 1_000], help="students per waitlist")
+    parser.add_argument("--operations", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'waiting':>10}{'memory drops/s':>16}{'journaled drops/s':>19}{'promotions/drop':>17}")
+    for waiting in args.waiting:
+        with tempfile.TemporaryDirectory() as directory:
+            registry = build_registry(directory, args.courses, args.capacity, waiting, args.seed)
+            storage, registry.storage = registry.storage, None
+            in_memory, promotions = bench(registry, args.operations, random.Random(args.seed))
+            registry.storage = storage
+            journaled, _ = bench(registry, args.operations, random.Random(args.seed))
+            print(f"{waiting:>10}{in_memory:>16.0f}{journaled:>19.0f}{promotions:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#! /usr/bin/env python3
+"""
+desc: This script kills a process writing the csv files at random points and checks what a restart loads. Each
+trial starts a child process that registers students through CsvStorage with the background flusher, compacts the
+journal into the registrations csv file every few hundred changes, and reports how many registrations it has
+flushed. The child is killed with SIGKILL at a random moment, and the files are loaded again: the registrations csv
+file must have no torn rows and every registration the child reported flushed must still be there. With
+--in-place, the csv files are written the way they were before atomic_write, truncated and rewritten in place, to
+show the failures atomic writes prevent.
+
+    python fault_injection.py --trials 20
+    python fault_injection.py --trials 20 --in-place
+"""
+import argparse
+import contextlib
+import csv
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_utils
+from generate_data import generate
+from policy import Policy
+from registry import Registry
+from storage import CsvStorage
+
+COMPACT_EVERY = 300
+
+
+@contextlib.contextmanager
+def write_in_place(file_path):
+    """
+    This replaces atomic_write in the child with --in-place: the file is truncated and rewritten where it is
+    :param file_path: The path to the file being replaced
+    :return: The open file
+    """
+    with open(file_path, "w", newline="") as file:
+        yield file
+
+
+def child(args):
+    """
+    This is the killed process: it registers random pairs forever, flushing and compacting as it goes, and prints
+    the number of registrations on disk after every flush
+    :param args: This is the parsed command line
+    """
+    if args.in_place:
+        data_utils.atomic_write = write_in_place
+    storage = CsvStorage(flush_window=args.flush_window)
+    registry = Registry.from_storage(storage, Policy(course_capacity=10 ** 9, unit_limit=10 ** 9,
+                                                     check_conflicts=False))
+    student_ids = [student.student_id for student in registry.students]
+    course_ids = [course.course_id for course in registry.courses]
+    rng = random.Random(args.seed)
+    print("ready", flush=True)
+    changes = 0
+    while True:
+        student_id, course_id = rng.choice(student_ids), rng.choice(course_ids)
+        if data_utils.register_course(registry, student_id, course_id)[0]:
+            changes += 1
+            if changes % COMPACT_EVERY == 0:
+                storage.compact(registry)
+                print(len(registry.registrations), flush=True)
+
+
+def check(directory, flushed):
+    """
+    This loads the files a killed child left behind
+    :param directory: This is the directory of the csv files
+    :param flushed: This is the last number of registrations the child reported on disk
+    :return: A description of what is wrong, or None if the files are intact
+    """
+    os.chdir(directory)
+    with open(data_utils.REGISTRATION_FILENAME, newline="") as file:
+        for row in csv.reader(file, delimiter="\t"):
+            if len(row) != 2 or not row[1].strip().isdigit():
+                return f"torn row {row}"
+    try:
+        storage = CsvStorage()
+        registry = Registry.from_storage(storage)
+        storage.close()
+    except (OSError, ValueError) as error:
+        return f"load failed: {error}"
+    loaded = len(registry.registrations)
+    if loaded < flushed:
+        return f"{flushed - loaded} of {flushed} flushed registrations lost"
+    return None
+
+
+def trial(args, seed):
+    """
+    This runs one child in a fresh directory, kills it and checks the files
+    :param args: This is the parsed command line
+    :param seed: This is the random seed of the trial
+    :return: A description of what is wrong, or None if the files are intact
+    """
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        generate(directory, args.students, args.courses, args.enrollments, seed)
+        command = [sys.executable, os.path.abspath(__file__), "--child", "--seed", str(seed),
+                   "--flush-window", str(args.flush_window)]
+        if args.in_place:
+            command.append("--in-place")
+        process = subprocess.Popen(command, cwd=directory, stdout=subprocess.PIPE, text=True)
+        process.stdout.readline()
+        time.sleep(rng.uniform(0.05, args.max_delay))
+        process.send_signal(signal.SIGKILL)
+        output = process.communicate()[0].split()
+        flushed = int(output[-1]) if output else 0
+        return check(directory, flushed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kill a writing process at random points and check the files")
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--students", type=int, default=20_000)
+    parser.add_argument("--courses", type=int, default=500)
+    parser.add_argument("--enrollments", type=int, default=3)
+    parser.add_argument("--flush-window", type=float, default=0.01)
+    parser.add_argument("--max-delay", type=float, default=2.0, help="latest kill, in seconds after loading")
+    parser.add_argument("--in-place", action="store_true", help="rewrite the csv files in place")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    failures = 0
+    for number in range(args.trials):
+        problem = trial(args, args.seed + number)
+        if problem is not None:
+            failures += 1
+            print(f"trial {number}: {problem}")
+    print(f"{failures} of {args.trials} trials left damaged files.")
+
+
+if __name__ == "__main__":
+    main()
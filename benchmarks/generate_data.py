@@ -0,0 +1,85 @@
+#! /usr/bin/env python3
+"""
+desc: This generates a deterministic synthetic term of tab-separated students.csv, courses.csv and
+registration.csv files in the same format as the shipped fixtures. The same arguments and seed always produce the
+same files.
+
+    python benchmarks/generate_data.py out/ --students 100000 --courses 2000 --enrollments 4
+"""
+import argparse
+import os
+import random
+
+FIRST_NAMES = ["Kelly", "Hal", "Oliver", "Selina", "Steve", "Barry", "Matt", "Barbara", "Tony", "Dick", "Peter",
+               "Billy", "Bruce", "Carol", "Diana", "Clark", "Lois", "Wally", "Kara", "Victor", "Jessica", "Luke"]
+LAST_NAMES = ["Mcbean", "Jordan", "Queen", "Kyle", "Rogers", "Allen", "Murdock", "Gordon", "Stark", "Grayson",
+              "Parker", "Batson", "Banner", "Danvers", "Prince", "Wayne", "Kent", "Lane", "West", "Zor", "Stone",
+              "Jones", "Cage", "Rand", "Wilson", "Romanoff", "Barton", "Maximoff"]
+SUBJECTS = ["CIM", "CIMA", "CIMN", "CIMP", "CIMS", "CIMW", "MATH", "ENG", "HIST", "BIO", "CHEM", "PHYS"]
+TOPICS = ["Programming with Python", "Intro to Cybersecurity", "Networking Essentials", "Spreadsheets-Excel",
+          "Web Design", "Cloud Computing", "Calculus", "Composition", "World History", "Cell Biology",
+          "Organic Chemistry", "Mechanics", "Statistics", "Databases", "Operating Systems"]
+UNITS = [1.5, 3.0, 3.0, 3.0, 3.5, 4.0]
+DAYS = ["Online", "Online", "Online", "M", "T", "W", "Th", "F"]
+TIMES = ["8:00AM-10:00AM", "10:00AM-12:00PM", "12:30PM-2:30PM", "3:00PM-5:00PM", "6:00PM-8:00PM"]
+INSTRUCTORS = [f"{initial}.{last}" for initial in "ABCDGJKLST" for last in LAST_NAMES[:12]]
+FIRST_TICKET = 10000
+
+
+def generate(directory, students=10_000, courses=500, enrollments=3, seed=0):
+    """
+    This writes students.csv, courses.csv and registration.csv into a directory
+    :param directory: This is the directory to write the files to
+    :param students: This is the number of students
+    :param courses: This is the number of courses
+    :param enrollments: This is the number of courses each student is registered for
+    :param seed: This is the random seed
+    :return: A tuple of (student ids, course ids) that were written
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    student_ids = []
+    numbers = {}
+    with open(os.path.join(directory, "students.csv"), "w", newline="") as file:
+        for _ in range(students):
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            # The same id scheme as generate_student_id: first initial, last name and a counter
+            prefix = f"{first_name[0]}{last_name}".lower()
+            number = numbers.get(prefix, 0)
+            numbers[prefix] = number + 1
+            student_id = f"{prefix}{number}"
+            student_ids.append(student_id)
+            file.write(f"{student_id}\t{last_name}\t{first_name}\n")
+
+    course_ids = [FIRST_TICKET + 5 * i for i in range(courses)]
+    with open(os.path.join(directory, "courses.csv"), "w", newline="") as file:
+        for course_id in course_ids:
+            day = rng.choice(DAYS)
+            time = "" if day == "Online" else rng.choice(TIMES)
+            file.write(f"{course_id}\t{rng.choice(SUBJECTS)} {rng.randrange(1, 300)}\t{rng.choice(TOPICS)}\t"
+                       f"{rng.choice(UNITS)}\t{day}\t{time}\t{rng.choice(INSTRUCTORS)}\n")
+
+    with open(os.path.join(directory, "registration.csv"), "w", newline="") as file:
+        for student_id in student_ids:
+            for course_id in rng.sample(course_ids, min(enrollments, len(course_ids))):
+                file.write(f"{student_id}\t{course_id}\n")
+
+    return student_ids, course_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic registration dataset")
+    parser.add_argument("directory")
+    parser.add_argument("--students", type=int, default=10_000)
+    parser.add_argument("--courses", type=int, default=500)
+    parser.add_argument("--enrollments", type=int, default=3, help="courses per student")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.directory, args.students, args.courses, args.enrollments, args.seed)
+    print(f"Wrote {args.students} students, {args.courses} courses and "
+          f"{args.students * min(args.enrollments, args.courses)} registrations to {args.directory}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#! /usr/bin/env python3
+"""
+desc: This is the load-test harness for server.py. It drives N simulated clients, each sending a mix of
+info/list/detail/register/drop commands, and reports throughput and latency percentiles. By default it starts an
+in-process server over synthetic data in a temporary directory; --host/--port point it at a running server instead.
+--readers starts the in-process server with that many reader processes answering info, list and detail.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_utils
+from records import Student
+from registry import Registry
+from server import END_OF_RESPONSE, RegistrationServer
+from storage import CsvStorage
+
+COMMAND_MIX = ["info"] * 4 + ["detail"] * 3 + ["register"] * 2 + ["drop"] + ["list"]
+
+
+def build_registry(students, courses):
+    """
+    This builds a registry of synthetic students and courses with no registrations, saved to csv files in the
+    working directory
+    :param students: This is the number of students
+    :param courses: This is the number of courses
+    :return: The registry
+    """
+    # The files are written first, since reader processes load their replicas from them
+    data_utils.write_students([Student(f"s{i}", f"Last{i}", f"First{i}") for i in range(students)])
+    with open(data_utils.COURSES_FILENAME, "w") as file:
+        file.writelines(f"{10000 + i}\tCIM {i}\tCourse {i}\t3.0\tOnline\t\tStaff\n" for i in range(courses))
+    data_utils.write_registrations([])
+    return Registry.from_storage(CsvStorage())
+
+
+async def client(host, port, requests, students, courses, latencies, seed):
+    """
+    This is one simulated student session
+    :param host: This is the server host
+    :param port: This is the server port
+    :param requests: This is the number of commands to send
+    :param students: This is the number of students to pick ids from
+    :param courses: This is the number of courses to pick tickets from
+    :param latencies: This is the list each command's latency in seconds is appended to
+    :param seed: This is the random seed of the session
+    """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    student_id = f"s{rng.randrange(students)}"
+    for _ in range(requests):
+        command = rng.choice(COMMAND_MIX)
+        ticket_number = 10000 + rng.randrange(courses)
+        if command == "info":
+            line = f"info {student_id}"
+        elif command == "detail":
+            line = f"detail {ticket_number}"
+        elif command in ("register", "drop"):
+            line = f"{command} {student_id} {ticket_number}"
+        else:
+            line = "list"
+        start = time.perf_counter()
+        writer.write((line + "\n").encode())
+        await writer.drain()
+        while (await reader.readline()).decode().rstrip("\n") != END_OF_RESPONSE:
+            pass
+        latencies.append(time.perf_counter() - start)
+    writer.write(b"exit\n")
+    await writer.drain()
+    writer.close()
+
+
+def percentile(values, fraction):
+    """
+    This returns a percentile of a sorted list
+    :param values: This is the sorted list of values
+    :param fraction: This is the percentile as a fraction, e.g. 0.99
+    :return: The value at that percentile
+    """
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(args):
+    """
+    This runs the load test and prints the report
+    :param args: This is the parsed command line
+    """
+    server = None
+    host, port = args.host, args.port
+    if port is None:
+        registration_server = RegistrationServer(build_registry(args.students, args.courses), args.readers)
+        await registration_server.start_readers()
+        server = await registration_server.start("127.0.0.1", 0)
+        host, port = server.sockets[0].getsockname()[:2]
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, args.requests, args.students, args.courses, latencies, seed)
+                           for seed in range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+        registration_server.close()
+
+    latencies.sort()
+    print(f"clients:    {args.clients}")
+    print(f"commands:   {len(latencies)}")
+    print(f"throughput: {len(latencies) / elapsed:.0f} commands/s")
+    print(f"latency:    mean {statistics.mean(latencies) * 1000:.2f} ms, "
+          f"p50 {percentile(latencies, 0.50) * 1000:.2f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the registration server")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=50, help="commands sent by each client")
+    parser.add_argument("--students", type=int, default=10_000)
+    parser.add_argument("--courses", type=int, default=200)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="use a running server instead of starting one")
+    parser.add_argument("--readers", type=int, default=0, help="reader processes of the in-process server")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        # The in-process server writes its journal in the working directory
+        os.chdir(directory)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
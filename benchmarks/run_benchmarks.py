@@ -0,0 +1,159 @@
+#! /usr/bin/env python3
+"""
+desc: This is the benchmark runner for the registration workflows. It generates a synthetic dataset with
+generate_data.py, calls the data_utils functions behind info/list/detail/register/drop/add and the read_*
+loaders non-interactively, and records ops/sec and peak memory for each one. The results are written as JSON so
+runs from different commits can be compared:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import count, cycle
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_utils
+from generate_data import generate
+from policy import Policy
+from registry import Registry
+from storage import CsvStorage
+
+# Every registration attempt goes through the whole register path instead of stopping at a full course
+UNLIMITED = Policy(course_capacity=10 ** 9, unit_limit=10 ** 9)
+
+
+def build_workloads(registry, student_ids, course_ids, operations, rng):
+    """
+    This builds the workloads to measure. Each workload is a function that runs one operation.
+    :param registry: This is the registry the commands run against
+    :param student_ids: This is the list of generated student ids
+    :param course_ids: This is the list of generated course ids
+    :param operations: This is the number of operations each workload runs
+    :param rng: This is the random number generator
+    :return: A dictionary of name -> (number of operations, function)
+    """
+    # One more than the number of operations, for the run that measures memory
+    students = [rng.choice(student_ids) for _ in range(operations + 1)]
+    courses = [str(rng.choice(course_ids)) for _ in range(operations + 1)]
+    pairs = iter(zip(students, courses))
+    drops = iter(zip(students, courses))
+    info_students = cycle(students)
+    detail_courses = cycle(courses)
+    names = count()
+
+    return {
+        "read_students": (5, lambda: data_utils.read_students()),
+        "read_courses": (5, lambda: data_utils.read_courses(data_utils.COURSES_FILENAME)),
+        "read_registrations": (5, lambda: data_utils.read_registrations(data_utils.REGISTRATION_FILENAME)),
+        "info": (operations, lambda: data_utils.info_lines(registry, next(info_students))),
+        "detail": (operations, lambda: data_utils.detail_lines(registry, registry.course(next(detail_courses)))),
+        "list": (max(1, operations // 100), lambda: data_utils.listing_lines(registry.catalog())),
+        "register": (operations, lambda: data_utils.register_course(registry, *next(pairs))),
+        "drop": (operations, lambda: data_utils.drop_course(registry, *next(drops))),
+        "add": (max(1, operations // 100), lambda: data_utils.add("Bench", f"Mark{next(names)}", registry)),
+    }
+
+
+def measure(operations, function):
+    """
+    This runs an operation a number of times and measures it
+    :param operations: This is the number of times to run the operation
+    :param function: This is the operation
+    :return: A dictionary with the ops/sec and the peak memory allocated by one operation
+    """
+    start = time.perf_counter()
+    for _ in range(operations):
+        function()
+    elapsed = time.perf_counter() - start
+
+    # Peak memory is measured on one extra run, since tracing slows every allocation down
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"operations": operations, "ops_per_sec": operations / elapsed, "peak_bytes": peak}
+
+
+def git_commit():
+    """
+    :return: The current git commit, or None outside a git checkout
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous):
+    """
+    This prints the change in ops/sec and peak memory against a previous run
+    :param results: This is the current run
+    :param previous: This is the previous run
+    """
+    print(f"\nCompared with {previous.get('commit')}:")
+    for name, result in results["results"].items():
+        before = previous["results"].get(name)
+        if before is None:
+            continue
+        speed = result["ops_per_sec"] / before["ops_per_sec"] - 1
+        memory = result["peak_bytes"] / before["peak_bytes"] - 1 if before["peak_bytes"] else 0
+        print(f"{name:>20}{speed:>+12.1%} ops/sec{memory:>+12.1%} peak memory")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the registration workflows")
+    parser.add_argument("--students", type=int, default=10_000)
+    parser.add_argument("--courses", type=int, default=500)
+    parser.add_argument("--enrollments", type=int, default=3, help="courses per student")
+    parser.add_argument("--operations", type=int, default=1_000, help="operations per command benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results in this JSON file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    previous_path = os.path.abspath(args.compare) if args.compare else None
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "dataset": {"students": args.students, "courses": args.courses, "enrollments": args.enrollments,
+                    "seed": args.seed},
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        student_ids, course_ids = generate(directory, args.students, args.courses, args.enrollments, args.seed)
+        os.chdir(directory)
+        registry = Registry.from_storage(CsvStorage(), UNLIMITED)
+        workloads = build_workloads(registry, student_ids, course_ids, args.operations, random.Random(args.seed))
+        # add prints a greeting for every new student
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name, (operations, function) in workloads.items():
+                results["results"][name] = measure(operations, function)
+
+    print(f"{'benchmark':>20}{'ops/sec':>14}{'peak KiB':>12}")
+    for name, result in results["results"].items():
+        print(f"{name:>20}{result['ops_per_sec']:>14.1f}{result['peak_bytes'] / 1024:>12.1f}")
+
+    if output:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+    if previous_path:
+        with open(previous_path) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#! /usr/bin/env python3
+"""
+desc: This module registers or drops students in bulk. The input file has one tab-separated
+(student id, ticket #) pair per line, the same format as registration.csv. Every pair is checked for capacity,
+unit limit and duplicates, everything accepted is saved with one write, and a tab-separated report with one
+accepted/waitlisted/rejected row per pair is written. A student registering for a full course who passes every other
+check is put on its waitlist and reported as waitlisted.
+
+    python bulk_enroll.py register cohort.csv --report report.csv
+    python bulk_enroll.py drop cohort.csv
+"""
+import argparse
+import csv
+import sys
+from collections import Counter
+
+import data_utils
+from registry import Registry
+from storage import open_storage
+
+
+def read_pairs(file_path):
+    """
+    This reads the (student id, ticket #) pairs from a tab-separated file
+    :param file_path: The path to the file
+    :return: A generator of (student_id, ticket_number)
+    """
+    with open(file_path, newline="") as file:
+        for row in csv.reader(file, delimiter="\t"):
+            if len(row) == 2:
+                yield row[0].strip(), row[1].strip()
+
+
+def write_report(report, file):
+    """
+    This writes the per-row report as tab-separated rows
+    :param report: This is the list of (student_id, ticket_number, outcome, message)
+    :param file: This is the open file to write to
+    """
+    writer = csv.writer(file, delimiter="\t", lineterminator="\n")
+    for student_id, ticket_number, outcome, message in report:
+        writer.writerow([student_id, ticket_number, outcome, message])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Register or drop students in bulk")
+    parser.add_argument("action", choices=["register", "drop"])
+    parser.add_argument("pairs", help="tab-separated file of student id, ticket # pairs")
+    parser.add_argument("--report", help="write the report to this file instead of standard output")
+    parser.add_argument("--database", help="use this SQLite database instead of the csv files")
+    args = parser.parse_args()
+
+    storage = open_storage(args.database)
+    registry = Registry.from_storage(storage, data_utils.read_policy())
+    if args.action == "register":
+        report = data_utils.register_many(registry, read_pairs(args.pairs))
+    else:
+        report = data_utils.drop_many(registry, read_pairs(args.pairs))
+    storage.close()
+
+    if args.report:
+        with open(args.report, "w", newline="") as file:
+            write_report(report, file)
+    else:
+        write_report(report, sys.stdout)
+    outcomes = Counter(row[2] for row in report)
+    print(f"{outcomes[data_utils.ACCEPTED]} accepted, {outcomes[data_utils.WAITLISTED]} waitlisted, "
+          f"{outcomes[data_utils.REJECTED]} rejected.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#! /usr/bin/env python3
+"""
+desc: This module contains the Catalog class, the course listing built once from the courses: the courses sorted by
+ticket number, the formatted line of each course, and indexes by code, day and instructor. The list command is
+served from it instead of sorting and formatting every course on every call. The registry rebuilds the catalog
+when the courses file changes.
+"""
+from bisect import bisect_left
+
+from records import DAY_PATTERN
+
+# The number of courses on a page when the list command asks for a page
+PAGE_SIZE = 20
+# A character that sorts after every character of a course code
+LAST_CHARACTER = "\uffff"
+
+HEADER = [
+    "Course Listing by Ticket",
+    "Ticket   Code     Course Name                                 Units   Day   Time          Instructor",
+    "===================================================================================================",
+]
+
+
+class Catalog:
+    """
+    This is the sorted, formatted and indexed course listing. Filters are answered from the indexes, and the
+    positions they return are positions in the sorted listing, so a filtered listing stays sorted by ticket number.
+    """
+
+    def __init__(self, courses):
+        """
+        This sorts the courses, formats their lines and builds the indexes
+        :param courses: This is the list of the courses
+        """
+        self.courses = sorted(courses, key=lambda course: course.course_id)
+        self.lines = [
+            f"{course.course_id:<9}{course.course_code:<9}{course.course_name:<45}{course.credit_hours:>5.1f}  "
+            f"{course.day:<6}{course.time:<14}{course.instructor:<15}"
+            for course in self.courses
+        ]
+        # (upper case code, position) sorted by code, so a code prefix is a contiguous range
+        self.codes = sorted((course.course_code.upper(), position) for position, course in enumerate(self.courses))
+        # lower case day -> positions, and lower case instructor -> positions. A course is indexed under every day
+        # it meets, so 'MW' is found by 'M' and by 'W', and under its whole day string, e.g. 'MW' or 'Online'
+        self.by_day = {}
+        self.by_instructor = {}
+        for position, course in enumerate(self.courses):
+            for day in {course.day.lower(), *(day.lower() for day in DAY_PATTERN.findall(course.day))}:
+                self.by_day.setdefault(day, []).append(position)
+            self.by_instructor.setdefault(course.instructor.lower(), []).append(position)
+
+    def __len__(self):
+        return len(self.courses)
+
+    def code_positions(self, prefix):
+        """
+        This finds the courses whose code starts with a prefix, e.g. 'CIM'
+        :param prefix: This is the code prefix, in any case
+        :return: The set of positions of the matching courses
+        """
+        prefix = prefix.upper()
+        # Every code starting with the prefix sorts between the prefix and the prefix followed by the highest
+        # character, so both ends of the range are found by bisection and nothing outside it is visited
+        start = bisect_left(self.codes, (prefix,))
+        end = bisect_left(self.codes, (prefix + LAST_CHARACTER,), start)
+        return {self.codes[index][1] for index in range(start, end)}
+
+    def positions(self, code=None, day=None, instructor=None):
+        """
+        This finds the courses matching every filter that is given
+        :param code: This is a code prefix, or None
+        :param day: This is a day, e.g. 'M' or 'Online', or a day string, e.g. 'TTh', or None
+        :param instructor: This is an instructor, e.g. 'S.Vu', or None
+        :return: The sorted list of positions of the matching courses
+        """
+        matches = None
+        if code is not None:
+            matches = self.code_positions(code)
+        for index, key in ((self.by_day, day), (self.by_instructor, instructor)):
+            if key is not None:
+                found = index.get(key.lower(), ())
+                matches = set(found) if matches is None else matches.intersection(found)
+        if matches is None:
+            return range(len(self.courses))
+        return sorted(matches)
+
+    def listing_lines(self, page=None, page_size=PAGE_SIZE, code=None, day=None, instructor=None):
+        """
+        This builds the lines of the course listing, or of one page of it
+        :param page: This is the page number, starting at 1, or None for every course
+        :param page_size: This is the number of courses on a page
+        :param code: This is a code prefix to filter by, or None
+        :param day: This is a day to filter by, or None
+        :param instructor: This is an instructor to filter by, or None
+        :return: The list of lines to display
+        """
+        if code is None and day is None and instructor is None:
+            lines = self.lines
+        else:
+            lines = [self.lines[position] for position in self.positions(code, day, instructor)]
+        total = len(lines)
+
+        if page is None:
+            return HEADER + lines + [f"{total} Courses"]
+        pages = max(1, -(-total // page_size))
+        page = min(max(page, 1), pages)
+        start = (page - 1) * page_size
+        return HEADER + lines[start:start + page_size] + [f"{total} Courses, page {page} of {pages}"]
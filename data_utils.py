@@ -1,8 +1,33 @@
 #! /usr/bin/env python3
+import configparser
 import csv
+import os
+import uuid
+from contextlib import contextmanager
 from datetime import datetime, time
 
+from policy import Policy
+from records import Course, Registration, Student
+
 FILENAME = "students.csv"
+COURSES_FILENAME = "courses.csv"
+REGISTRATION_FILENAME = "registration.csv"
+POLICY_FILENAME = "policy.cfg"
+# Each register/drop is appended to the journal, which is folded back into the snapshot once it is at least this
+# size and at least JOURNAL_COMPACT_RATIO times the size of the registrations csv file. The number of changes
+# between two rewrites of the file grows with the file, so the rewrites cost a constant amount per change.
+JOURNAL_COMPACT_SIZE = 64 * 1024
+JOURNAL_COMPACT_RATIO = 1.0
+# The journal records a register ('+'), a drop ('-'), joining a waitlist ('w') and leaving a waitlist ('x')
+JOURNAL_OPERATIONS = ("+", "-", "w", "x")
+# The first record of a journal segment started by a compaction: the header operation, the generation of the
+# segment it follows and its own generation. The segment before the first compaction has no header and the empty
+# generation. parse_journal skips the header.
+JOURNAL_HEADER = "="
+# The outcomes register_many and drop_many report for each pair
+ACCEPTED = "accepted"
+WAITLISTED = "waitlisted"
+REJECTED = "rejected"
 current_time = datetime.now().time()
 
 """
@@ -18,32 +43,45 @@ def display_menu1():
     This displays the menu to the screen and displays the list of options that the user can do.
     """
     print("info     - Student information")
-    print("list     - Course listing")
+    print("list     - Course listing (filter with code=, day=, instructor=, page with page=, size=)")
     print("detail   - Course detail")
     print("register - Register for a class")
-    print("drop     - Drop class")
+    print("drop     - Drop class or leave its waitlist")
+    print("stats    - Timing statistics")
     print("menu     - Menu")
     print("exit     - Exit")
     print()
 
 
-def read_students():
+def read_students(file_path=FILENAME, offset=0):
     """
     This reads the students csv file, and returns the contents of the file as list back to the calling function
-    :return: The contents of the students csv file is returned as a list
+    :param file_path: The path to the students csv file.
+    :param offset: This is the byte offset to start reading at, e.g. the end of the students in the binary snapshot
+    :return: The contents of the students csv file is returned as a list of Student records
+    """
+    with open(file_path, newline="") as file:
+        file.seek(offset)
+        return parse_students(csv.reader(file, delimiter="\t"))
+
+
+def parse_students(rows):
+    """
+    This turns the rows of the students csv file into Student records
+    :param rows: This is an iterable of rows, e.g. a csv reader
+    :return: The list of Student records
     """
     students = []
-    with open(FILENAME, newline="") as file:
-        reader = csv.reader(file, delimiter="\t")
-        for row in reader:
-            students.append(row)
+    for row in rows:
+        if len(row) == 3:
+            students.append(Student(row[0].strip(), row[1].strip(), row[2].strip()))
     return students
 
 
 def read_courses(file_path):
     """
     This reads the courses csv file, and returns the contents of the file as list back to the calling function
-    :return: The contents of the courses csv file is returned as a list
+    :return: The contents of the courses csv file is returned as a list of Course records
     """
     # Initialize an empty list to store the courses
     courses = []
@@ -52,31 +90,60 @@ def read_courses(file_path):
         reader = csv.reader(csv_file, delimiter='\t')
         for row in reader:
             if len(row) == 7:
-                # Extract the data from the row and create a course dictionary
+                # Extract the data from the row and create a course record
                 course_id, course_code, course_name, credit_hours, day, time, instructor = row
-                course = {
-                    'course_id': int(course_id.strip()),
-                    'course_code': course_code.strip(),
-                    'course_name': course_name.strip(),
-                    'credit_hours': float(credit_hours.strip()),
-                    'day': day.strip(),
-                    'time': time.strip(),
-                    'instructor': instructor.strip()
-                }
-                # Add the course dictionary to the courses list
+                course = Course(int(course_id.strip()), course_code.strip(), course_name.strip(),
+                                float(credit_hours.strip()), day.strip(), time.strip(), instructor.strip())
+                # Add the course record to the courses list
                 courses.append(course)
     # The list of courses is returned
     return courses
 
 
-def write_students(students):
+@contextmanager
+def atomic_write(file_path):
+    """
+    This opens a temporary file next to a file for writing, and when the block ends without an error, syncs it
+    to disk and renames it over the file. A crash at any point leaves either the old file or the new one, never a
+    truncated or half-written file.
+    :param file_path: The path to the file being replaced
+    :return: The open temporary file
+    """
+    temporary_path = file_path + ".tmp"
+    try:
+        with open(temporary_path, "w", newline="") as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    sync_directory(file_path)
+
+
+def sync_directory(file_path):
+    """
+    This syncs the directory holding a file, so a rename or removal in it survives a crash
+    :param file_path: The path to a file in the directory
+    """
+    directory = os.open(os.path.dirname(os.path.abspath(file_path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+def write_students(students, file_path=FILENAME):
     """
     This writes content to the students csv file, and the students csv file is updated
     :param students: This is the name of the file that is passed in and the file we are writing to
+    :param file_path: The path to the students csv file.
     """
-    with open(FILENAME, "w", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerows(students)
+    with atomic_write(file_path) as file:
+        writer = csv.writer(file, delimiter="\t")
+        writer.writerows([student.student_id, student.last_name, student.first_name] for student in students)
 
 
 def display_menu():
@@ -87,28 +154,166 @@ def display_menu():
     print()
 
 
-def read_registrations(file_path):
+def iter_registration_changes(file_path, rows=None):
     """
-    This reads the registrations csv file and returns the contents of the file as a list.
+    This streams the registrations csv file without building a list: every row of the csv file is yielded as a
+    registration, followed by the rows of the waitlist file and the records of the registration journal.
     :param file_path: The path to the registrations csv file.
-    :return: The contents of the registrations csv file as a list of dictionaries.
+    :param rows: This is an iterable of ('+', Registration) read in place of the csv file, e.g. from the snapshot,
+    or None to read the csv file
+    :return: A generator of (operation, Registration) where operation is '+' for a registration, '-' for a drop,
+    'w' for joining a waitlist and 'x' for leaving one
+    """
+    yield from iter_registration_rows(file_path) if rows is None else rows
+    yield from iter_waitlist(file_path)
+    yield from iter_journal(file_path)
+
+
+def iter_registration_rows(file_path):
+    """
+    This streams the rows of the registrations csv file alone, without the waitlist file or the journal
+    :param file_path: The path to the registrations csv file.
+    :return: A generator of ('+', Registration)
     """
-    # Initialize an empty list to store the courses
-    registrations = []
     with open(file_path, 'r') as csv_file:
         reader = csv.reader(csv_file, delimiter='\t')
         for row in reader:
             if len(row) == 2:
-                # Extract the data from the row and create a registration dictionary
+                # Extract the data from the row and create a registration record
                 username, registration_id = row
-                registration = {
-                    'student_id': username.strip(),
-                    'course_id': int(registration_id.strip())
-                }
-                # Add the registration dictionary to the registrations list
-                registrations.append(registration)
+                yield "+", Registration(username.strip(), int(registration_id.strip()))
+
+
+def iter_waitlist(file_path):
+    """
+    This streams the waitlist file that belongs to a registrations csv file. Its rows are in waitlist order.
+    :param file_path: The path to the registrations csv file.
+    :return: A generator of ('w', Registration)
+    """
+    path = waitlist_path(file_path)
+    if os.path.exists(path):
+        with open(path, 'r') as waitlist_file:
+            reader = csv.reader(waitlist_file, delimiter='\t')
+            for row in reader:
+                if len(row) == 2:
+                    yield "w", Registration(row[0], int(row[1]))
+
+
+def iter_journal(file_path):
+    """
+    This streams the records of the registration journal
+    :param file_path: The path to the registrations csv file.
+    :return: A generator of (operation, Registration) where operation is one of JOURNAL_OPERATIONS
+    """
+    path = journal_path(file_path)
+    if os.path.exists(path):
+        with open(path, 'r') as journal_file:
+            yield from parse_journal(csv.reader(journal_file, delimiter='\t'))
+
+
+def parse_journal(rows):
+    """
+    This turns the rows of the registration journal into changes
+    :param rows: This is an iterable of rows, e.g. a csv reader
+    :return: A generator of (operation, Registration) where operation is one of JOURNAL_OPERATIONS
+    """
+    for row in rows:
+        # A partially written last record (e.g. after a crash) is skipped
+        if len(row) != 3 or row[0] not in JOURNAL_OPERATIONS or not row[2].isdigit():
+            continue
+        yield row[0], Registration(row[1], int(row[2]))
+
+
+def read_registrations(file_path):
+    """
+    This reads the registrations csv file and returns the contents of the file as a list. Any register/drop
+    records in the registration journal are replayed on top of the csv file.
+    :param file_path: The path to the registrations csv file.
+    :return: The contents of the registrations csv file as a list of Registration records.
+    """
+    # The registrations are keyed by (student_id, course_id) so that journaled drops can be replayed in O(1)
+    registrations = {}
+    for operation, registration in iter_registration_changes(file_path):
+        key = (registration.student_id, registration.course_id)
+        if operation == "+":
+            # Add the registration record to the registrations
+            registrations.setdefault(key, registration)
+        elif operation == "-":
+            registrations.pop(key, None)
+
+    return [registration for registration in registrations.values()]
+
+
+def journal_path(file_path):
+    """
+    This returns the path of the journal that belongs to a registrations csv file
+    :param file_path: The path to the registrations csv file.
+    :return: The path to the registration journal
+    """
+    return file_path + ".journal"
+
+
+def sealed_journal_path(file_path):
+    """
+    This returns the path of the last compacted segment of the journal that belongs to a registrations csv file
+    :param file_path: The path to the registrations csv file.
+    :return: The path to the sealed journal segment
+    """
+    return journal_path(file_path) + ".sealed"
+
 
-    return registrations
+def waitlist_path(file_path):
+    """
+    This returns the path of the waitlist file that belongs to a registrations csv file
+    :param file_path: The path to the registrations csv file.
+    :return: The path to the waitlist file
+    """
+    return file_path + ".waitlist"
+
+
+def read_policy(file_path=POLICY_FILENAME):
+    """
+    This reads the registration limits from the policy file. The defaults are used if the file does not exist.
+    :param file_path: The path to the policy file.
+    :return: The Policy holding the seat capacities and unit limits
+    """
+    parser = configparser.ConfigParser()
+    # Keep student ids case sensitive
+    parser.optionxform = str
+    parser.read(file_path)
+
+    policy = Policy()
+    if parser.has_section("defaults"):
+        policy.course_capacity = parser.getint("defaults", "course_capacity", fallback=policy.course_capacity)
+        policy.unit_limit = parser.getfloat("defaults", "unit_limit", fallback=policy.unit_limit)
+        policy.check_conflicts = parser.getboolean("defaults", "check_conflicts", fallback=policy.check_conflicts)
+    if parser.has_section("course_capacity"):
+        for course_id, capacity in parser.items("course_capacity"):
+            policy.course_capacities[int(course_id)] = int(capacity)
+    if parser.has_section("unit_limit"):
+        for student_id, unit_limit in parser.items("unit_limit"):
+            policy.unit_limits[student_id] = float(unit_limit)
+    return policy
+
+
+def check_seat_counts(registry, file_path=REGISTRATION_FILENAME):
+    """
+    This verifies the registry's seat counters against the registration csv file (and its journal). Any course
+    whose counter does not match is reported, and the registrations and counters are rebuilt from the file.
+    :param registry: This is the registry holding the seat counters
+    :param file_path: The path to the registrations csv file.
+    :return: A dictionary of course id -> (counter value, counted value) for every course that did not match
+    """
+    registrations = read_registrations(file_path)
+    mismatches = registry.verify_seat_counts(registrations)
+    for course_id, (taken, counted) in sorted(mismatches.items()):
+        print(f"{course_id}: counter is {taken}, {file_path} has {counted}.")
+    if mismatches:
+        registry.rebuild_seat_counts(registrations)
+        print(f"Seat counters of {len(mismatches)} course(s) rebuilt from {file_path}.")
+    else:
+        print(f"Seat counters match {file_path}.")
+    return mismatches
 
 
 def time_calculation(student, current_time):
@@ -119,155 +324,308 @@ def time_calculation(student, current_time):
     """
     if current_time >= time(0, 0) and current_time < time(12, 0):
         print()
-        print(f"Good Morning {student[2].title()}, what would you like to do today?")
+        print(f"Good Morning {student.first_name.title()}, what would you like to do today?")
         print()
         display_menu1()
     elif current_time >= time(12, 0) and current_time < time(17, 0):
         print()
-        print(f"Good Afternoon {student[2].title()}, what would you like to do today?")
+        print(f"Good Afternoon {student.first_name.title()}, what would you like to do today?")
         print()
         display_menu1()
     else:
         print()
-        print(f"Good Evening {student[2].title()}, what would you like to do today?")
+        print(f"Good Evening {student.first_name.title()}, what would you like to do today?")
         print()
         display_menu1()
 
 
-def find(student_names, student_id):
+def find(registry, student_id):
     """
-    This takes the list of the students and a student ID entered by the user and checks if the ID entered is
+    This takes the registry and a student ID entered by the user and checks if the ID entered is
     a valid student ID.
-    :param student_names: This is the list of the students that we are searching in.
+    :param registry: This is the registry holding the students that we are searching in.
     :param student_id: This is the student ID that is entered by the user and that we are validating.
+    :return: The student ID as it is stored, whatever case the user typed it in
     """
     while True:
-        found = False
-        for student in student_names:
-            # Check if the student name in the list matches the one entered by the user
-            if student[0].lower() == student_id.lower():
-                time_calculation(student, current_time)
-                found = True
-                break
-        if not found:
+        # Look the id up in the case-insensitive login index
+        student = registry.find_student(student_id)
+        if student is None:
             print(f"{student_id} was not found.\n")
             # Prompt the user to enter a valid student id
             student_id = input("Enter Student ID (or 'add' to add a new student, or 'exit' to exit the application): ")
         else:
-            break
-def write_registrations(registrations):
-    """
-    This writes the registration information to the registration csv file.
-    :param registrations: The list of registration dictionaries to be written.
-    """
-    with open("registration.csv", "w", newline="") as file:
-        writer = csv.writer(file)
-        # Iterate over each registration dictionary in the list
+            time_calculation(student, current_time)
+            return student.student_id
+def write_registrations(registrations, file_path=REGISTRATION_FILENAME, waitlist=None):
+    """
+    This writes the registration information to the registration csv file. This is the compaction step: once
+    the snapshot has been written, the journal is no longer needed and is sealed, and an empty one is started. The
+    waitlists are written first, since the journal also holds the changes to them.
+    :param registrations: The list of registration records to be written.
+    :param file_path: The path to the registrations csv file.
+    :param waitlist: The list of registration records of the students waiting, in waitlist order, or None to leave
+    the waitlist file as it is
+    """
+    if waitlist is not None:
+        with atomic_write(waitlist_path(file_path)) as file:
+            writer = csv.writer(file, delimiter="\t")
+            writer.writerows([registration.student_id, registration.course_id] for registration in waitlist)
+    with atomic_write(file_path) as file:
+        writer = csv.writer(file, delimiter="\t")
+        # Iterate over each registration record in the list
         for registration in registrations:
             # Write a row to the CSV file containing the student_id and course_id values
-            # taken from the registration dictionary
-            writer.writerow([registration['student_id'], registration['course_id']])
+            # taken from the registration record
+            writer.writerow([registration.student_id, registration.course_id])
+    # Replaying the journal over the new snapshot is harmless, so a crash before this point loses nothing
+    seal_journal(file_path)
+
+
+def seal_journal(file_path=REGISTRATION_FILENAME):
+    """
+    This ends the journal segment that has just been compacted and starts an empty one. The old segment is kept
+    as the sealed segment, replacing the previous one, so a reader following the journal can finish it and then
+    go on with the new segment, whose header names the segment it follows. The sealed segment is a second name
+    for the old journal, renamed over the previous one before the new journal is renamed over the old one, so
+    neither file is ever missing once it has been written.
+    :param file_path: The path to the registrations csv file.
+    """
+    path = journal_path(file_path)
+    sealed_path = sealed_journal_path(file_path)
+    previous = journal_header(path)[1] if os.path.exists(path) else ""
+    with atomic_write(path) as file:
+        file.write(f"{JOURNAL_HEADER}\t{previous}\t{uuid.uuid4().hex}\n")
+        if os.path.exists(path):
+            link_path = sealed_path + ".tmp"
+            if os.path.exists(link_path):
+                os.remove(link_path)
+            os.link(path, link_path)
+            os.replace(link_path, sealed_path)
+
+
+def journal_header(file_path):
+    """
+    This reads the header of a journal segment
+    :param file_path: The path to the journal segment
+    :return: A tuple of (generation of the segment it follows, its generation), or (None, '') for the segment
+    written before the first compaction
+    """
+    with open(file_path, "r", newline="") as file:
+        return parse_journal_header(file.readline())
+
+
+def parse_journal_header(line):
+    """
+    This reads the generations in the first line of a journal segment
+    :param line: This is the first line of the segment
+    :return: A tuple of (generation of the segment it follows, its generation), or (None, '') if the line is not
+    a header
+    """
+    row = line.rstrip("\r\n").split("\t")
+    if len(row) == 3 and row[0] == JOURNAL_HEADER:
+        return row[1], row[2]
+    return None, ""
 
 
-def generate_student_id(first_name, last_name, existing_ids):
+def compaction_threshold(file_path=REGISTRATION_FILENAME):
+    """
+    This returns the size the journal has to reach before it is compacted into the registrations csv file
+    :param file_path: The path to the registrations csv file.
+    :return: The size in bytes
+    """
+    try:
+        size = os.path.getsize(file_path)
+    except OSError:
+        size = 0
+    return max(JOURNAL_COMPACT_SIZE, int(JOURNAL_COMPACT_RATIO * size))
+
+
+def journal_registration(operation, student_id, course_id, file_path=REGISTRATION_FILENAME):
+    """
+    This appends a single register ('+') or drop ('-') record to the registration journal
+    :param operation: This is '+' for a registration and '-' for a drop
+    :param student_id: This is the student id
+    :param course_id: This is the course id
+    :param file_path: The path to the registrations csv file.
+    :return: The size of the journal in bytes after the record was appended
+    """
+    with open(journal_path(file_path), "a", newline="") as file:
+        file.write(f"{operation}\t{student_id}\t{course_id}\n")
+        return file.tell()
+
+
+def journal_registrations(changes, file_path=REGISTRATION_FILENAME, sync=False):
+    """
+    This appends a batch of records to the registration journal with one write, e.g. a drop together with the
+    promotion from the waitlist it made possible
+    :param changes: This is the list of (operation, student_id, course_id)
+    :param file_path: The path to the registrations csv file.
+    :param sync: This is True to fsync the journal after the write
+    :return: The size of the journal in bytes after the records were appended
+    """
+    with open(journal_path(file_path), "a", newline="") as file:
+        file.write(journal_records(changes))
+        if sync:
+            file.flush()
+            os.fsync(file.fileno())
+        return file.tell()
+
+
+def journal_records(changes):
+    """
+    This formats changes as the records of the registration journal
+    :param changes: This is the list of (operation, student_id, course_id)
+    :return: The records, one line each
+    """
+    return "".join(f"{operation}\t{student_id}\t{course_id}\n" for operation, student_id, course_id in changes)
+
+
+def generate_student_id(first_name, last_name, registry):
     """
     This generates a random student id for a new student added to the csv file.
     If the user enters the same name that is found in the csv file , the digit in their
     username is incremented so the same id is not used for two students
     :param first_name: This is the first name of the student
     :param last_name: This is the last name of the student
-    :param existing_ids: This is the ids of the existing students
+    :param registry: This is the registry holding the next free number of every name prefix
     :return: The unique id is returned to the calling function
     """
-    number = 0
-    student_id = f"{first_name[0]}{last_name}{number}"
-    # Checking if the student id created matches an id that has already been used
-    while student_id in existing_ids:
-        number += 1
-        student_id = f"{first_name[0]}{last_name}{number}"
-    return student_id
+    return registry.next_student_id(first_name, last_name)
 
 
-def add(first_name, last_name, students):
+def add(first_name, last_name, registry):
     """
     This adds a student to the students csv file. The first name, and last name (entered)
     by the user is combined with a digit to create a unique student id, and the student is
     added to the students list
     :param first_name: This is the first name of the student
     :param last_name: This is the first name of the student
-    :param students: This is the list of the students
-    """
-    # Create a list of existing student ids from the students list
-    existing_ids = [student[0] for student in students]
-    # Generate a unique student id based on the first name, last name, and list of existing ids
-    student_id = generate_student_id(first_name, last_name, existing_ids)
-    # Create a tuple representing the student information (student_id, first_name, last_name)
-    student = (student_id, first_name, last_name)
-    # Add the student to the list
-    students.append(student)
-    # Update the students csv file
-    write_students(students)
+    :param registry: This is the registry holding the list of the students
+    """
+    # Generate a unique student id based on the first name, last name, and the ids already in the registry
+    student_id = generate_student_id(first_name, last_name, registry)
+    # Create a record representing the student information
+    student = Student(student_id, last_name, first_name)
+    # Add the student to the list and to the student index
+    registry.add_student(student)
+    # Update the students file
+    registry.save_student(student)
     print(f"Student {student_id.lower()} has been added.")
     time_calculation(student, current_time)
 
 
-def info(students, registration_info, student_id, courses):
+def info_lines(registry, student_id):
+    """
+    This builds the lines of the information of a specific student and the courses the student is registered for.
+    :param registry: This is the registry holding the students, courses and registrations.
+    :param student_id: This is the student id of the individual student.
+    :return: The list of lines to display
+    """
+    # Find the student's name
+    student = registry.student(student_id)
+    if student is None:
+        return [f"{student_id} was not found.", ""]
+    student_name = f"{student.last_name}, {student.first_name}"
+
+    # Retrieve the student's registered courses and their unit total from the schedule cache
+    schedule = registry.schedule(student_id)
+    student_courses, total_units = schedule.courses, schedule.total_units
+
+    # Student information
+    lines = [f"Student id: {student_id}", student_name, "Registered Courses"]
+
+    # The list of courses
+    lines.append("Ticket   Code     Course Name                                 Units   Day   Time          Instructor")
+    lines.append("===========================================================================================================")
+    for course in student_courses:
+        lines.append("{:<9}{:<9}{:<45}{:>5.1f}  {:<6}{:<14}{:<15}".format(
+            course.course_id, course.course_code, course.course_name, course.credit_hours, course.day,
+            course.time, course.instructor
+        ))
+
+    # The total line
+    lines.append(f"{len(student_courses)} Course(s) Registered")
+    lines.append(f"                                                        Units: {total_units:>5.1f}")
+    return lines
+
+
+def info(registry, student_id):
     """
     This displays the information of a specific student and the courses the student is registered for.
-    :param students: This is the list of the students.
-    :param registration_info: This is the courses that each student is registered for.
+    :param registry: This is the registry holding the students, courses and registrations.
     :param student_id: This is the student id of the individual student.
-    :param courses: This is the list of courses available for registration.
     """
     print()
-    student_courses = []
-    total_units = 0
-    student_name = ""
-
-    # Find the student's registered courses and name
-    for student in students:
-        if student[0] == student_id:
-            student_name = f"{student[1]}, {student[2]}"
-            break
+    for line in info_lines(registry, student_id):
+        print(line)
+
+
+def detail_lines(registry, course):
+    """
+    This builds the lines of the information of a specific course and the students that are registered for it.
+    :param registry: This is the registry holding the students, courses and registrations
+    :param course: This is the course record
+    :return: The list of lines to display
+    """
+    lines = [
+        f"Code: {course.course_code} Course Name: {course.course_name}",
+        f"Units: {course.credit_hours} Day: {course.day} Time: {course.time}",
+        f"Instructor: {course.instructor}",
+        "===================================",
+    ]
+    registered_students = registry.course_students(course.course_id)
+    # Check if the registered students list is empty
+    if registered_students:
+        for student in registered_students:
+            # Formatting according to the specifications in the assignment
+            student_id = student.student_id.ljust(13)
+            last_name = student.last_name.ljust(11)
+            first_name = student.first_name.ljust(16)
+            lines.append(f"{student_id}{last_name}{first_name}")
+        lines.append(f"Total Students Registered: {len(registered_students)}")
     else:
-        print(f"{student_id} was not found.\n")
-        return
+        lines.append("No students registered for this course.")
+    waiting = registry.waitlist_length(course.course_id)
+    if waiting:
+        lines.append(f"Students on the Waitlist: {waiting}")
+    return lines
 
-    # Retrieve the student's registered courses
-    for registration in registration_info:
-        if registration['student_id'] == student_id:
-            course_id = registration['course_id']
-            for course in courses:
-                if course['course_id'] == course_id:
-                    student_courses.append(course)
-                    total_units += course['credit_hours']
-
-    # Display student information
-    print(f"Student id: {student_id}")
-    print(student_name)
-    print("Registered Courses")
-
-    # Display the list of courses
-    print("Ticket   Code     Course Name                                 Units   Day   Time          Instructor")
-    print("===========================================================================================================")
-    for course in student_courses:
-        print("{:<9}{:<9}{:<45}{:>5.1f}  {:<6}{:<14}{:<15}".format(
-            course['course_id'], course['course_code'], course['course_name'], course['credit_hours'], course['day'],
-            course['time'], course['instructor']
-        ))
 
-    # Display the total line
-    print(f"{len(student_courses)} Course(s) Registered")
-    print(f"                                                        Units: {total_units:>5.1f}")
+def roster_rows(registry, courses):
+    """
+    This streams the rosters of courses as rows, from the course to student index, so every roster costs the
+    number of students registered for it
+    :param registry: This is the registry holding the students, courses and registrations
+    :param courses: This is an iterable of the course records
+    :return: A generator of [ticket #, code, student id, last name, first name]
+    """
+    for course in courses:
+        for student in registry.course_students(course.course_id):
+            yield [course.course_id, course.course_code, student.student_id, student.last_name, student.first_name]
+
+
+def write_rosters(registry, courses, file):
+    """
+    This writes the rosters of courses as tab-separated rows, one row per registered student
+    :param registry: This is the registry holding the students, courses and registrations
+    :param courses: This is an iterable of the course records
+    :param file: This is the open file to write to
+    :return: The number of rows written
+    """
+    writer = csv.writer(file, delimiter="\t", lineterminator="\n")
+    rows = 0
+    for row in roster_rows(registry, courses):
+        writer.writerow(row)
+        rows += 1
+    return rows
 
 
-def detail(courses, registration_info, students):
+def detail(registry):
     """
     This displays the information of a specific course such as the instructor, the number of
     units, and it displays the students that are registered for the course.
-    :param courses: This is the list of the courses
-    :param registration_info: This is the courses that each student is registered for
-    :param students: This is the list of the students
+    :param registry: This is the registry holding the students, courses and registrations
     """
     print()
     while True:
@@ -276,58 +634,92 @@ def detail(courses, registration_info, students):
             print()
             return
 
-        found = False
-        for course in courses:
-            # Checking if the ticket numbers match
-            if str(course['course_id']) == ticket_number:
-                # Printing the course details
-                print()
-                print(f"Code: {course['course_code']} Course Name: {course['course_name']}")
-                print(f"Units: {course['credit_hours']} Day: {course['day']} Time: {course['time']}")
-                print(f"Instructor: {course['instructor']}")
-                print("===================================")
-                registered_students = []
-                for registration in registration_info:
-                    # Checking if the course ids match with one another
-                    if registration['course_id'] == course['course_id']:
-                        # Student id is extracted
-                        student_id = registration['student_id']
-                        for student in students:
-                            # If the student id in registration matches the student id
-                            # of the current student, then the student is registered
-                            if student[0] == student_id:
-                                registered_students.append(student)
-                                break
-                # Check if the registered students list is empty
-                if registered_students:
-                    for student in registered_students:
-                        # Formatting according to the specifications in the assignment
-                        student_id = student[0].ljust(13)
-                        last_name = student[2].ljust(16)
-                        first_name = student[1].ljust(11)
-                        print(f"{student_id}{first_name}{last_name}")
-                    print(f"Total Students Registered: {len(registered_students)}")
-                else:
-                    print("No students registered for this course.")
-                found = True
-                break
-
-        if not found:
+        course = registry.course(ticket_number)
+        if course is None:
             print(f"{ticket_number} not found.")
             continue
 
+        # Printing the course details
+        print()
+        for line in detail_lines(registry, course):
+            print(line)
+
         print()
         break
 
 
-def drop(students, student_id, registration_info, courses):
+def promote(registry, course):
+    """
+    This fills the free seats of a course from the front of its waitlist. Every student taken off the waitlist goes
+    through the registration checks again, and a student who no longer passes them (e.g. who is now over their
+    unit limit) loses their place and the next student is tried.
+    :param registry: This is the registry holding the students, courses and registrations
+    :param course: This is the course record
+    :return: A tuple of (the list of (operation, student_id, course_id) that were applied, the list of messages)
+    """
+    changes = []
+    messages = []
+    course_id = course.course_id
+    while registry.seats(course_id) < registry.policy.capacity(course_id):
+        student_id = registry.next_waiting(course_id)
+        if student_id is None:
+            break
+        changes.append(("x", student_id, course_id))
+        error = registration_error(registry, student_id, course)
+        if error is None:
+            registry.add_registration(student_id, course_id)
+            changes.append(("+", student_id, course_id))
+            messages.append(f"{student_id} was added to {course_id} from the waitlist.")
+        else:
+            messages.append(f"{student_id} was removed from the waitlist for {course_id}. {error}")
+    return changes, messages
+
+
+def apply_drop(registry, student_id, course):
+    """
+    This drops a student from a course, or takes them off its waitlist, in the registry and promotes students from
+    the waitlist into the free seat. Nothing is saved.
+    :param registry: This is the registry holding the students, courses and registrations
+    :param student_id: This is the student id of the student dropping the course
+    :param course: This is the course record
+    :return: A tuple of (True if the course was dropped, the message describing the result, the list of
+    (operation, student_id, course_id) that were applied)
+    """
+    course_id = course.course_id
+    if registry.is_waiting(student_id, course_id):
+        registry.leave_waitlist(student_id, course_id)
+        return True, f"{student_id} was removed from the waitlist for {course_id}.", [("x", student_id, course_id)]
+    # Check if the student is registered for the entered ticket number
+    if not registry.remove_registration(student_id, course_id):
+        return False, f"{course_id} not found.", []
+    changes, messages = promote(registry, course)
+    return True, " ".join([f"{student_id} was dropped from {course_id}."] + messages), \
+        [("-", student_id, course_id)] + changes
+
+
+def drop_course(registry, student_id, ticket_number):
+    """
+    This drops a student from a course without prompting
+    :param registry: This is the registry holding the students, courses and registrations
+    :param student_id: This is the student id of the student dropping the course
+    :param ticket_number: This is the ticket number of the course
+    :return: A tuple of (True if the course was dropped, the message describing the result)
+    """
+    course = registry.course(ticket_number)
+    if course is None:
+        return False, f"{ticket_number} not found."
+    dropped, message, changes = apply_drop(registry, student_id, course)
+    # Update the file after dropping the student, with the promotions from the waitlist in the same write
+    registry.save_registrations(changes)
+    return dropped, message
+
+
+def drop(registry, student_id):
     """
     This allows a student to drop a course and ensures that the ticket number
     entered is valid.
-    :param students: This is the list of the students
+    :param registry: This is the registry holding the students, courses and registrations
     :param student_id: This is the student id of the student dropping the course
-    :param registration_info: This is the courses that each student is registered for
-    :param courses: This is the list of the courses
     """
     print("Enter ticket # or 'exit'")
     while True:
@@ -336,55 +728,159 @@ def drop(students, student_id, registration_info, courses):
             print()
             return
 
-        found = False
-        # Iterate over the registration info list
-        for i, reg in enumerate(registration_info):
-            # Check if the student ID and course ID match the entered ticket number
-            if reg['student_id'] == student_id and str(reg['course_id']) == ticket_number:
-                registration_info.pop(i)
-                print(f"{student_id} was dropped from {ticket_number}.")
-                # Update the file after dropping the student
-                write_registrations(registration_info)
-                found = True
-                break
-
-        if not found:
-            print(f"{ticket_number} not found.")
-        else:
+        dropped, message = drop_course(registry, student_id, ticket_number)
+        print(message)
+        if dropped:
             break
 
-def register(students, student_id, registration_info, courses):
+
+def registration_error(registry, student_id, course, check_seats=True):
+    """
+    This goes through the checks a registration has to pass: class size, unit limit, duplicate registration and
+    schedule conflicts.
+    :param registry: This is the registry holding the students, courses and registrations
+    :param student_id: This is the student id of the student registering for the course
+    :param course: This is the course record
+    :param check_seats: This is False to skip the class size check, e.g. before joining a waitlist
+    :return: The message explaining why the student cannot register, or None if the student can register
+    """
+    course_id = course.course_id
+
+    # Checking if the class has a seat left
+    if check_seats and registry.seats(course_id) >= registry.policy.capacity(course_id):
+        return f"{course_id} is full."
+
+    # Checking if the total number of units that the student is registered
+    # for does not exceed their unit limit
+    schedule = registry.schedule(student_id)
+    total_units = schedule.total_units
+    if total_units + course.credit_hours > registry.policy.max_units(student_id):
+        return f"Cannot register for {course_id}. Exceeds maximum unit limit."
+
+    # Checking if the student has already registered for this course
+    if registry.is_registered(student_id, course_id):
+        return f"{student_id} is already registered for this course."
+
+    # Checking if the course meets at the same time as a course the student is registered for
+    if registry.policy.check_conflicts:
+        conflict = schedule.conflict(course)
+        if conflict is not None:
+            return f"Cannot register for {course_id}. Conflicts with {conflict}."
+
+    return None
+
+
+def apply_register(registry, student_id, course):
+    """
+    This registers a student for a course in the registry, or puts them on its waitlist if the course is full and
+    they pass every other check. Nothing is saved.
+    :param registry: This is the registry holding the students, courses and registrations
+    :param student_id: This is the student id of the student registering for the course
+    :param course: This is the course record
+    :return: A tuple of (True if the student was registered, the message describing the result, the list of
+    (operation, student_id, course_id) that were applied)
+    """
+    course_id = course.course_id
+    error = registration_error(registry, student_id, course)
+    if error is not None and registry.seats(course_id) >= registry.policy.capacity(course_id):
+        # The course is full: a student who could otherwise register waits for a seat instead of retrying
+        error = registration_error(registry, student_id, course, check_seats=False)
+        if error is None:
+            if not registry.join_waitlist(student_id, course_id):
+                return False, f"{student_id} is already on the waitlist for {course_id}.", []
+            return False, f"{course_id} is full. {student_id} was added to the waitlist, " \
+                          f"{registry.waitlist_length(course_id)} waiting.", [("w", student_id, course_id)]
+    if error is not None:
+        return False, error, []
+
+    # Student is registered after all the checks
+    registry.add_registration(student_id, course_id)
+    return True, f"{student_id} was added to {course_id}.", [("+", student_id, course_id)]
+
+
+def register_course(registry, student_id, ticket_number):
+    """
+    This registers a student for a course without prompting
+    :param registry: This is the registry holding the students, courses and registrations
+    :param student_id: This is the student id of the student registering for the course
+    :param ticket_number: This is the ticket number of the course
+    :return: A tuple of (True if the student was registered, the message describing the result)
+    """
+    course = registry.course(ticket_number)
+    if course is None:
+        return False, f"{ticket_number} not found."
+
+    registered, message, changes = apply_register(registry, student_id, course)
+    # Updating the registration csv file
+    if changes:
+        registry.save_registration(*changes[0])
+    return registered, message
+
+
+def register_many(registry, pairs):
+    """
+    This registers students for courses without prompting, e.g. for a bulk enrollment job. Every pair goes through
+    the same checks as register, against the registrations accepted so far, and all the accepted registrations and
+    waitlist places are saved with one write at the end.
+    :param registry: This is the registry holding the students, courses and registrations
+    :param pairs: This is an iterable of (student_id, ticket_number)
+    :return: A list of (student_id, ticket_number, outcome, message), one per pair, where outcome is ACCEPTED,
+    WAITLISTED or REJECTED
+    """
+    report = []
+    changes = []
+    for student_id, ticket_number in pairs:
+        course = registry.course(ticket_number)
+        if registry.student(student_id) is None:
+            report.append((student_id, ticket_number, REJECTED, f"{student_id} was not found."))
+        elif course is None:
+            report.append((student_id, ticket_number, REJECTED, f"{ticket_number} not found."))
+        else:
+            registered, message, applied = apply_register(registry, student_id, course)
+            changes.extend(applied)
+            # A full course puts the student on its waitlist, which is saved too
+            if registered:
+                outcome = ACCEPTED
+            elif applied:
+                outcome = WAITLISTED
+            else:
+                outcome = REJECTED
+            report.append((student_id, ticket_number, outcome, message))
+    registry.save_registrations(changes)
+    return report
+
+
+def drop_many(registry, pairs):
+    """
+    This drops students from courses without prompting, and saves all the drops with one write at the end
+    :param registry: This is the registry holding the students, courses and registrations
+    :param pairs: This is an iterable of (student_id, ticket_number)
+    :return: A list of (student_id, ticket_number, outcome, message), one per pair, where outcome is ACCEPTED or
+    REJECTED
+    """
+    report = []
+    changes = []
+    for student_id, ticket_number in pairs:
+        course = registry.course(ticket_number)
+        if course is None:
+            report.append((student_id, ticket_number, REJECTED, f"{ticket_number} not found."))
+        else:
+            dropped, message, applied = apply_drop(registry, student_id, course)
+            changes.extend(applied)
+            report.append((student_id, ticket_number, ACCEPTED if dropped else REJECTED, message))
+    registry.save_registrations(changes)
+    return report
+
+
+def register(registry, student_id):
     """
     This allows a student to register for a course and ensures that the ticket number
     entered is valid. The function goes through a variety of checks such as class size,
     unit limit, etc. to ensure that the student is able to register for the course.
-    :param students: This is the list of the students
+    :param registry: This is the registry holding the students, courses and registrations
     :param student_id: This is the student id of the student registering for the course
-    :param registration_info: This is the courses that each student is registered for
-    :param courses: This is the list of the courses
     """
-    total_units = 0
-    student_courses = []
-    student_name = ""
     print()
-
-    # Calculating the total number of units before registering for a course
-    for student in students:
-        # Find a matching student id
-        if student[0] == student_id:
-            student_name = f"{student[1]}, {student[2]}"
-            break
-
-    if student_name:
-        for registration in registration_info:
-            # If a matching student id is found in the list of registered students
-            if registration['student_id'] == student_id:
-                course_id = registration['course_id']
-                for course in courses:
-                    if course['course_id'] == course_id:
-                        student_courses.append(course)
-                        total_units += course['credit_hours']
-
     print("Enter ticket # or 'exit'")
     while True:
         ticket_number = input("Enter course ticket # (or 'exit'): ")
@@ -392,71 +888,63 @@ def register(students, student_id, registration_info, courses):
             print()
             return
 
-        found = False
-        for course in courses:
-            if str(course['course_id']) == ticket_number:
-                # Checking if the class limit does not exceed 15
-                if sum(1 for reg in registration_info if str(reg['course_id']) == ticket_number) >= 15:
-                    print(f"{ticket_number} is full.")
-                    print()
-                    return
-
-                total_units += course['credit_hours']
-
-                # Checking if the total number of units that the student is registered
-                # for does not exceed 12
-                if total_units > 12:
-                    print(f"Cannot register for {ticket_number}. Exceeds maximum unit limit.")
-                    print()
-                    return
-
-                # Checking if the student has already registered for this course
-                for reg in registration_info:
-                    # Checking the ticket number entered
-                    if str(reg['course_id']) == ticket_number:
-                        # Checking the student id of the student in the registered list
-                        # and the current list
-                        if reg['student_id'] == student_id:
-                            print(f"{student_id} is already registered for this course.")
-                            print()
-                            return
-                        found = True
-                        break
-
-                if not found:
-                    # Student is registered after all the checks
-                    registration_info.append({'student_id': student_id, 'course_id': ticket_number})
-                    # Updating the registration csv file
-                    write_registrations(registration_info)
-                    print(f"{student_id} was added to {ticket_number}.")
-                    print()
-                    return
-                break
-
-        if not found:
+        if registry.course(ticket_number) is None:
             print(f"{ticket_number} not found.")
+            continue
+
+        _, message = register_course(registry, student_id, ticket_number)
+        print(message)
+        print()
+        return
 
 
-def list(courses):
+def listing_options(words):
     """
-    This displays all the courses available for registration and lists the details of
-    each course
-    :param courses: This is the list of the courses.
+    This reads the options of the list command, e.g. ['code=CIMW', 'day=Online', 'page=2']. The options are code
+    (a code prefix), day, instructor, page and size (the number of courses on a page).
+    :param words: This is the list of the words after the list command
+    :return: A dictionary of the options for listing_lines, or None if an option is not valid
     """
-    i = 1
-    print()
-    print("Course Listing by Ticket")
-    print("Ticket   Code     Course Name                                 Units   Day   Time          Instructor")
-    print("===================================================================================================")
+    options = {}
+    for word in words:
+        name, _, value = word.partition("=")
+        name = name.lower()
+        if not value:
+            return None
+        if name in ("code", "day", "instructor"):
+            options[name] = value
+        elif name in ("page", "size") and value.isdigit() and int(value) > 0:
+            options["page" if name == "page" else "page_size"] = int(value)
+        else:
+            return None
+    if "page_size" in options and "page" not in options:
+        options["page"] = 1
+    return options
+
 
-    # Sort courses by ticket number
-    sorted_courses = sorted(courses, key=lambda x: x['course_id'])
+def listing_lines(catalog, **options):
+    """
+    This builds the lines of the course listing, sorted by ticket number
+    :param catalog: This is the Catalog of the courses.
+    :param options: These are the filters and the page, as returned by listing_options
+    :return: The list of lines to display
+    """
+    # The catalog holds the sorted courses and their formatted lines, so nothing is sorted or formatted here
+    return catalog.listing_lines(**options)
 
-    for course in sorted_courses:
-        i += 1
-        print(
-            f"{course['course_id']:<9}{course['course_code']:<9}{course['course_name']:<45}{course['credit_hours']:>5.1f}  {course['day']:<6}{course['time']:<14}{course['instructor']:<15}")
 
-    # Display the total line
-    print(str(i) + " Courses")
+def list(registry, words=()):
+    """
+    This displays all the courses available for registration and lists the details of
+    each course
+    :param registry: This is the registry holding the courses.
+    :param words: These are the options typed after the list command, e.g. ['code=CIM', 'page=2']
+    """
+    print()
+    options = listing_options(words)
+    if options is None:
+        print("Options are code=PREFIX, day=DAY, instructor=NAME, page=N and size=N.")
+    else:
+        for line in listing_lines(registry.catalog(), **options):
+            print(line)
     print()
@@ -0,0 +1,58 @@
+#! /usr/bin/env python3
+"""
+desc: This module exports the rosters of every course, or of the courses picked by ticket #, code prefix or
+instructor, to a tab-separated file in one pass, instead of running detail once per ticket. Every row is one
+registered student: ticket #, code, student id, last name and first name.
+
+    python export_rosters.py rosters.csv
+    python export_rosters.py rosters.csv --code CIM --instructor Staff
+    python export_rosters.py - --tickets 10000 10005
+"""
+import argparse
+import sys
+
+import data_utils
+from registry import Registry
+from storage import open_storage
+
+
+def select_courses(catalog, tickets=None, code=None, instructor=None):
+    """
+    This picks the courses whose rosters are exported, using the catalog's indexes for the code and instructor
+    :param catalog: This is the Catalog of the courses
+    :param tickets: This is the list of ticket numbers to keep, or None to keep every ticket
+    :param code: This is the course code prefix to keep, ignoring case, or None
+    :param instructor: This is the instructor to keep, ignoring case, or None
+    :return: The list of course records, in ticket order
+    """
+    courses = [catalog.courses[position] for position in catalog.positions(code=code, instructor=instructor)]
+    if tickets is None:
+        return courses
+    tickets = set(tickets)
+    return [course for course in courses if course.course_id in tickets]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export course rosters")
+    parser.add_argument("output", help="file to write the rosters to, or - for standard output")
+    parser.add_argument("--tickets", type=int, nargs="+", metavar="TICKET", help="only these ticket numbers")
+    parser.add_argument("--code", help="only courses whose code starts with this prefix")
+    parser.add_argument("--instructor", help="only courses taught by this instructor")
+    parser.add_argument("--database", help="use this SQLite database instead of the csv files")
+    args = parser.parse_args()
+
+    storage = open_storage(args.database)
+    registry = Registry.from_storage(storage, data_utils.read_policy())
+    courses = select_courses(registry.catalog(), args.tickets, args.code, args.instructor)
+    storage.close()
+
+    if args.output == "-":
+        rows = data_utils.write_rosters(registry, courses, sys.stdout)
+    else:
+        with open(args.output, "w", newline="") as file:
+            rows = data_utils.write_rosters(registry, courses, file)
+    print(f"Exported {rows} registrations from {len(courses)} courses.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#! /usr/bin/env python3
+"""
+desc: This module is the opt-in instrumentation for data_utils. enable() replaces the command and read/write
+functions in data_utils with timed wrappers that record call counts, a latency histogram, rows scanned and bytes
+written. Nothing is wrapped until enable() is called, so there is no overhead when instrumentation is off.
+"""
+import atexit
+import inspect
+import json
+import os
+import threading
+import time
+
+import data_utils
+
+# Latency buckets in microseconds; bucket i counts calls that took less than 2 ** i microseconds
+BUCKETS = 32
+
+
+def _file_path(args, kwargs, position, default):
+    """
+    This returns the file_path argument of a call to a read/write function
+    """
+    if "file_path" in kwargs:
+        return kwargs["file_path"]
+    return args[position] if len(args) > position else default
+
+
+def _count_rows(args, kwargs, result):
+    return len(result)
+
+
+def _count_argument_rows(args, kwargs, result):
+    return len(args[0])
+
+
+def _count_student_rows(args, kwargs, result):
+    return len(args[0].registrations_by_student.get(args[1], ()))
+
+
+def _count_course_rows(args, kwargs, result):
+    return len(args[0].registrations_by_course.get(args[1].course_id, ()))
+
+
+# data_utils function -> (metric name, rows scanned, bytes written)
+INSTRUMENTED = {
+    "info_lines": ("info", _count_student_rows, None),
+    "listing_lines": ("list", _count_argument_rows, None),
+    "detail_lines": ("detail", _count_course_rows, None),
+    # The server applies registrations and drops itself under its locks, so the checks and index updates are
+    # timed here rather than in register_course/drop_course; saving them is timed by the journal functions
+    "apply_register": ("register", None, None),
+    "apply_drop": ("drop", None, None),
+    "add": ("add", None, None),
+    "read_students": ("read_students", _count_rows, None),
+    "read_courses": ("read_courses", _count_rows, None),
+    "read_registrations": ("read_registrations", _count_rows, None),
+    "iter_registration_changes": ("load_registrations", None, None),
+    "write_students": ("write_students", _count_argument_rows,
+                       lambda args, kwargs, result: os.path.getsize(
+                           _file_path(args, kwargs, 1, data_utils.FILENAME))),
+    "write_registrations": ("write_registrations", _count_argument_rows,
+                            lambda args, kwargs, result: os.path.getsize(
+                                _file_path(args, kwargs, 1, data_utils.REGISTRATION_FILENAME))),
+    "journal_registration": ("journal_registration", None,
+                             lambda args, kwargs, result: len("\t".join(str(arg) for arg in args[:3])) + 1),
+    "journal_registrations": ("journal_registrations", _count_argument_rows,
+                              lambda args, kwargs, result: sum(len("\t".join(str(arg) for arg in change)) + 1
+                                                               for change in args[0])),
+}
+
+
+class Stat:
+    """
+    This holds the measurements of one instrumented function
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.histogram = [0] * BUCKETS
+        self.rows = 0
+        self.bytes_written = 0
+
+    def record(self, seconds, rows, bytes_written):
+        """
+        This adds one call
+        :param seconds: This is how long the call took
+        :param rows: This is the number of rows the call scanned
+        :param bytes_written: This is the number of bytes the call wrote
+        """
+        self.calls += 1
+        self.total_seconds += seconds
+        self.histogram[min(BUCKETS - 1, int(seconds * 1_000_000).bit_length())] += 1
+        self.rows += rows
+        self.bytes_written += bytes_written
+
+    def percentile(self, fraction):
+        """
+        This estimates a latency percentile from the histogram
+        :param fraction: This is the percentile as a fraction, e.g. 0.99
+        :return: The upper bound of the bucket holding the percentile, in seconds
+        """
+        target = fraction * self.calls
+        seen = 0
+        for bucket, calls in enumerate(self.histogram):
+            seen += calls
+            if calls and seen >= target:
+                return (2 ** bucket) / 1_000_000
+        return 0.0
+
+    def as_dict(self):
+        """
+        :return: The measurements as a JSON-friendly dictionary
+        """
+        return {
+            "calls": self.calls,
+            "total_seconds": self.total_seconds,
+            "p50_seconds": self.percentile(0.50),
+            "p99_seconds": self.percentile(0.99),
+            "histogram_us": {f"<{2 ** bucket}": calls for bucket, calls in enumerate(self.histogram) if calls},
+            "rows_scanned": self.rows,
+            "bytes_written": self.bytes_written,
+        }
+
+
+stats = {}
+_lock = threading.Lock()
+_originals = {}
+_dump_thread = None
+_dump_stop = threading.Event()
+
+
+def enabled():
+    """
+    :return: True if instrumentation is on
+    """
+    return bool(_originals)
+
+
+def _wrap(function, name, rows, bytes_written):
+    """
+    This builds the timed wrapper of an instrumented function
+    """
+    stat = stats.setdefault(name, Stat())
+
+    if inspect.isgeneratorfunction(function):
+        def wrapper(*args, **kwargs):
+            # A generator is timed from its first row to its last, and every row it yields counts as scanned
+            start = time.perf_counter()
+            scanned = 0
+            for item in function(*args, **kwargs):
+                scanned += 1
+                yield item
+            elapsed = time.perf_counter() - start
+            with _lock:
+                stat.record(elapsed, scanned, 0)
+    else:
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+            with _lock:
+                stat.record(elapsed,
+                            rows(args, kwargs, result) if rows else 0,
+                            bytes_written(args, kwargs, result) if bytes_written else 0)
+            return result
+
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def enable(dump_path=None, interval=60.0):
+    """
+    This turns instrumentation on, and optionally dumps the metrics to a JSON file every interval seconds and
+    at exit
+    :param dump_path: The path of the metrics dump file, or None for no dump
+    :param interval: This is the number of seconds between dumps
+    """
+    global _dump_thread
+    if not enabled():
+        for function_name, (name, rows, bytes_written) in INSTRUMENTED.items():
+            function = getattr(data_utils, function_name)
+            _originals[function_name] = function
+            setattr(data_utils, function_name, _wrap(function, name, rows, bytes_written))
+
+    if dump_path is not None and _dump_thread is None:
+        _dump_stop.clear()
+
+        def run():
+            while not _dump_stop.wait(interval):
+                dump(dump_path)
+
+        _dump_thread = threading.Thread(target=run, name="metrics-dump", daemon=True)
+        _dump_thread.start()
+        atexit.register(dump, dump_path)
+
+
+def disable():
+    """
+    This turns instrumentation off and puts the original functions back
+    """
+    global _dump_thread
+    for function_name, function in _originals.items():
+        setattr(data_utils, function_name, function)
+    _originals.clear()
+    if _dump_thread is not None:
+        _dump_stop.set()
+        _dump_thread = None
+
+
+def snapshot():
+    """
+    :return: The metrics of every instrumented function that has been called, as a dictionary
+    """
+    with _lock:
+        return {name: stat.as_dict() for name, stat in stats.items() if stat.calls}
+
+
+def dump(file_path):
+    """
+    This writes the metrics to a JSON file
+    :param file_path: The path of the metrics dump file
+    """
+    with open(file_path, "w") as file:
+        json.dump({"time": time.time(), "metrics": snapshot()}, file, indent=2)
+
+
+def report_lines():
+    """
+    This builds the lines of the stats command
+    :return: The list of lines to display
+    """
+    if not enabled():
+        return ["Instrumentation is off. Start with --metrics to turn it on."]
+    lines = [
+        "Operation             Calls   Mean ms    p50 ms    p99 ms        Rows     Bytes",
+        "=============================================================================",
+    ]
+    for name, stat in snapshot().items():
+        mean = stat["total_seconds"] / stat["calls"] * 1000
+        lines.append(f"{name:<20}{stat['calls']:>7}{mean:>10.3f}{stat['p50_seconds'] * 1000:>10.3f}"
+                     f"{stat['p99_seconds'] * 1000:>10.3f}{stat['rows_scanned']:>12}{stat['bytes_written']:>10}")
+    return lines
@@ -0,0 +1,46 @@
+#! /usr/bin/env python3
+"""
+desc: This module contains the Policy class, which holds the registration limits (seats per course and units per
+student) and whether schedule conflicts are checked. The limits are read from policy.cfg by data_utils.read_policy.
+"""
+
+COURSE_CAPACITY = 15
+UNIT_LIMIT = 12
+CHECK_CONFLICTS = True
+
+
+class Policy:
+    """
+    This holds the default seat capacity and unit limit along with any per-course and per-student overrides
+    """
+
+    def __init__(self, course_capacity=COURSE_CAPACITY, unit_limit=UNIT_LIMIT, course_capacities=None,
+                 unit_limits=None, check_conflicts=CHECK_CONFLICTS):
+        """
+        :param course_capacity: This is the number of seats in a course that has no override
+        :param unit_limit: This is the unit limit of a student that has no override
+        :param course_capacities: This maps a course id to its number of seats
+        :param unit_limits: This maps a student id to their unit limit
+        :param check_conflicts: This is True to reject a course that meets at the same time as one already registered
+        """
+        self.course_capacity = course_capacity
+        self.unit_limit = unit_limit
+        self.check_conflicts = check_conflicts
+        self.course_capacities = course_capacities or {}
+        self.unit_limits = unit_limits or {}
+
+    def capacity(self, course_id):
+        """
+        This returns the number of seats in a course
+        :param course_id: This is the course id
+        :return: The number of seats
+        """
+        return self.course_capacities.get(course_id, self.course_capacity)
+
+    def max_units(self, student_id):
+        """
+        This returns the maximum number of units a student can register for
+        :param student_id: This is the student id
+        :return: The unit limit
+        """
+        return self.unit_limits.get(student_id, self.unit_limit)
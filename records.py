@@ -0,0 +1,174 @@
+#! /usr/bin/env python3
+"""
+desc: This module contains the record types for the rows of the students, courses and registration csv files.
+They use __slots__, so a row costs a few pointers instead of a whole dictionary, and student ids are interned so
+that every registration of a student shares one string. A course's day and time are parsed once, when the record is
+made, into the meeting intervals the schedule conflict check uses.
+"""
+import re
+import sys
+from bisect import bisect_left, insort
+
+# The days a course can meet on, e.g. 'M', 'Th' or 'MW'
+DAY_PATTERN = re.compile(r"Th|Sa|Su|M|T|W|F")
+# A time range, e.g. '6:00PM-8:00PM'
+TIME_PATTERN = re.compile(r"(\d{1,2}):(\d{2})\s*([AP]M)\s*-\s*(\d{1,2}):(\d{2})\s*([AP]M)", re.IGNORECASE)
+
+
+def minutes(hour, minute, meridiem):
+    """
+    This converts a 12-hour clock time to minutes after midnight
+    :return: The number of minutes after midnight
+    """
+    return (int(hour) % 12 + (12 if meridiem.upper() == "PM" else 0)) * 60 + int(minute)
+
+
+def parse_meetings(day, time):
+    """
+    This parses the day and time fields of a course into meeting intervals. Online courses and courses without a
+    time have no meetings and never conflict.
+    :param day: This is the day field, e.g. 'M', 'TTh' or 'Online'
+    :param time: This is the time field, e.g. '6:00PM-8:00PM'
+    :return: A tuple of (day, start minute, end minute)
+    """
+    match = TIME_PATTERN.fullmatch(time.strip())
+    if match is None:
+        return ()
+    start, end = minutes(*match.group(1, 2, 3)), minutes(*match.group(4, 5, 6))
+    return tuple((weekday, start, end) for weekday in DAY_PATTERN.findall(day))
+
+
+class Student:
+    """
+    This is one row of the students csv file
+    """
+    __slots__ = ("student_id", "last_name", "first_name")
+
+    def __init__(self, student_id, last_name, first_name):
+        self.student_id = sys.intern(student_id)
+        self.last_name = last_name
+        self.first_name = first_name
+
+    def __repr__(self):
+        return f"Student({self.student_id!r}, {self.last_name!r}, {self.first_name!r})"
+
+
+class Course:
+    """
+    This is one row of the courses csv file
+    """
+    __slots__ = ("course_id", "course_code", "course_name", "credit_hours", "day", "time", "instructor", "meetings")
+
+    def __init__(self, course_id, course_code, course_name, credit_hours, day, time, instructor):
+        self.course_id = course_id
+        self.course_code = course_code
+        self.course_name = course_name
+        self.credit_hours = credit_hours
+        self.day = day
+        self.time = time
+        self.instructor = instructor
+        self.meetings = parse_meetings(day, time)
+
+    def __repr__(self):
+        return f"Course({self.course_id!r}, {self.course_code!r}, {self.course_name!r})"
+
+
+class Registration:
+    """
+    This is one row of the registration csv file
+    """
+    __slots__ = ("student_id", "course_id")
+
+    def __init__(self, student_id, course_id):
+        self.student_id = sys.intern(student_id)
+        self.course_id = course_id
+
+    def __repr__(self):
+        return f"Registration({self.student_id!r}, {self.course_id!r})"
+
+
+class Schedule:
+    """
+    This is the materialized schedule of one student: the courses the student is registered for, in registration
+    order, their unit total, and an interval index of their meetings. The index maps a day to the meetings on that
+    day sorted by start time, along with the latest end time up to each meeting and the course holding it, so a
+    conflict check is one binary search per meeting even if the courses already registered overlap each other.
+    """
+    __slots__ = ("courses", "total_units", "starts", "meetings", "latest_ends", "latest_courses")
+
+    def __init__(self, courses):
+        self.courses = []
+        self.total_units = 0
+        # day -> sorted list of start minutes, day -> sorted list of (start, end, course), day -> latest end
+        # minute of the meetings up to and including each one, and day -> the course id of the meeting ending then
+        self.starts = {}
+        self.meetings = {}
+        self.latest_ends = {}
+        self.latest_courses = {}
+        for course in courses:
+            self.add(course)
+
+    def add(self, course):
+        """
+        This adds a course to the schedule
+        :param course: This is the course record
+        """
+        self.courses.append(course)
+        self.total_units += course.credit_hours
+        for day, start, end in course.meetings:
+            insort(self.starts.setdefault(day, []), start)
+            insort(self.meetings.setdefault(day, []), (start, end, course.course_id))
+            self.index_day(day)
+
+    def remove(self, course):
+        """
+        This removes a course from the schedule
+        :param course: This is the course record
+        """
+        self.courses.remove(course)
+        # Summed again rather than subtracted, so the total cannot drift from the courses
+        self.total_units = sum(registered.credit_hours for registered in self.courses)
+        for day, start, end in course.meetings:
+            self.meetings[day].remove((start, end, course.course_id))
+            self.starts[day].remove(start)
+            self.index_day(day)
+
+    def index_day(self, day):
+        """
+        This rebuilds the latest end times of one day after a meeting was added or removed
+        :param day: This is the day
+        """
+        latest_ends = []
+        latest_courses = []
+        latest = -1
+        latest_course = None
+        for _, end, course_id in self.meetings[day]:
+            if end > latest:
+                latest, latest_course = end, course_id
+            latest_ends.append(latest)
+            latest_courses.append(latest_course)
+        self.latest_ends[day] = latest_ends
+        self.latest_courses[day] = latest_courses
+
+    def conflict(self, course):
+        """
+        This finds a course in the schedule that meets at the same time as a course
+        :param course: This is the course record
+        :return: The course id of a conflicting course, or None if there is no conflict
+        """
+        for day, start, end in course.meetings:
+            starts = self.starts.get(day)
+            if not starts:
+                continue
+            # Every meeting before position starts earlier; the first one from position on starts at or after
+            # start, so it conflicts if it starts before end
+            position = bisect_left(starts, start)
+            if position < len(starts) and starts[position] < end:
+                return self.meetings[day][position][2]
+            if position and self.latest_ends[day][position - 1] > start:
+                # The earlier meeting that ends last runs past start
+                return self.latest_courses[day][position - 1]
+        return None
+
+    def __repr__(self):
+        return f"Schedule({len(self.courses)} courses, {self.total_units!r} units)"
@@ -0,0 +1,504 @@
+#! /usr/bin/env python3
+"""
+desc: This module contains the Registry class, which holds the students, courses and registrations in memory
+and keeps hash indexes over them so that the lookups made by data_utils do not have to scan every list.
+"""
+import re
+from collections import OrderedDict, deque
+from itertools import count
+
+from catalog import Catalog
+from policy import Policy
+from records import Registration, Schedule
+
+# The number of student schedules kept in the schedule cache before the least recently used one is evicted
+SCHEDULE_CACHE_SIZE = 100_000
+
+# A student id is a name prefix (first initial and last name) followed by a number
+STUDENT_ID_PATTERN = re.compile(r"(.*?)(\d*)")
+
+
+class Registry:
+    """
+    This is the in-memory registry that is built once from read_students, read_courses and read_registrations.
+    Students are indexed by student id, courses by course id, and registrations by student id and by course id.
+    In lazy mode the registrations are only streamed in when a command first needs them.
+    """
+
+    def __init__(self, students, courses, registrations, policy=None, storage=None):
+        """
+        This builds the registry and its indexes from the rows returned by the read functions
+        :param students: This is the list of the students
+        :param courses: This is the list of the courses
+        :param registrations: This is the list of registration records
+        :param policy: This is the Policy holding the seat capacities and unit limits
+        :param storage: This is the storage backend changes are saved to, or None to keep them in memory only
+        """
+        self.policy = policy if policy is not None else Policy()
+        self.storage = storage
+        self.students = students
+        self.courses = courses
+        self.students_by_id = {}
+        # lowercased student_id -> student, for logins typed in any case
+        self.students_by_login = {}
+        # lowercased name prefix -> the next number generate_student_id hands out for it
+        self.next_student_number = {}
+        self.courses_by_id = {}
+        # student_id -> {course_id: registration}
+        self.registrations_by_student = {}
+        # course_id -> {student_id: registration}
+        self.registrations_by_course = {}
+        # course_id -> number of seats taken, kept up to date by add_registration and remove_registration
+        self.seats_taken = {}
+        # student_id -> Schedule of the most recently used students, oldest first, kept up to date by
+        # index_registration and unindex_registration
+        self.schedules = OrderedDict()
+        self.schedule_cache_size = SCHEDULE_CACHE_SIZE
+        # course_id -> deque of (ticket, student_id) in the order the students joined the waitlist, and
+        # course_id -> {student_id: ticket} of the students still on it. A student who leaves is only removed from
+        # the dictionary; their deque entry is skipped when it reaches the front, or dropped when the deque is
+        # rebuilt because the stale entries outnumber the live ones.
+        self.waitlists = {}
+        self.waiting = {}
+        self.waitlist_tickets = count()
+        # The (operation, registration) changes still to be loaded in lazy mode
+        self.pending_changes = None
+        # The course listing, built when the list command first needs it, and the version of the courses it was
+        # built from
+        self.course_catalog = None
+        self.courses_version = storage.courses_version() if storage is not None else None
+
+        for student in students:
+            self.index_student(student)
+        for course in courses:
+            self.courses_by_id[course.course_id] = course
+        for registration in registrations:
+            self.index_registration(registration)
+
+    @classmethod
+    def from_storage(cls, storage, policy=None, lazy=False):
+        """
+        This builds a registry from a storage backend. The registrations are indexed as they are streamed instead of
+        being read into a list first, and in lazy mode they are not read until a command needs them.
+        :param storage: This is the storage backend
+        :param policy: This is the Policy holding the seat capacities and unit limits
+        :param lazy: This is True to defer loading the registrations
+        :return: The registry
+        """
+        registry = cls(storage.read_students(), storage.read_courses(), (), policy, storage)
+        if lazy:
+            registry.pending_changes = storage.iter_registration_changes()
+        else:
+            registry.load_registrations(storage.iter_registration_changes())
+        return registry
+
+    def load_registrations(self, changes):
+        """
+        This indexes a stream of registrations as it is read, without building a list of them first
+        :param changes: This is an iterable of (operation, registration), e.g. from iter_registration_changes
+        """
+        for operation, registration in changes:
+            if operation == "+":
+                self.index_registration(registration)
+            elif operation == "-":
+                self.unindex_registration(registration.student_id, registration.course_id)
+            elif operation == "w":
+                self.join_waitlist(registration.student_id, registration.course_id)
+            else:
+                self.leave_waitlist(registration.student_id, registration.course_id)
+
+    def load_pending(self):
+        """
+        This loads the registrations that lazy mode deferred, if there are any
+        """
+        if self.pending_changes is not None:
+            changes, self.pending_changes = self.pending_changes, None
+            self.load_registrations(changes)
+
+    @property
+    def registrations(self):
+        """
+        This returns the registrations as a list of records, in the same shape as read_registrations
+        :return: The list of registration records, grouped by student
+        """
+        self.load_pending()
+        return [registration for registrations in self.registrations_by_student.values()
+                for registration in registrations.values()]
+
+    @property
+    def waitlist_rows(self):
+        """
+        This returns the waitlists as a list of records
+        :return: The list of registration records of the students waiting, by course and in waitlist order
+        """
+        self.load_pending()
+        return [Registration(student_id, course_id) for course_id, waitlist in self.waitlists.items()
+                for ticket, student_id in waitlist if self.waiting[course_id].get(student_id) == ticket]
+
+    def catalog(self):
+        """
+        This returns the course listing, reloading the courses first if the courses file changed since they were
+        read. The listing is only rebuilt after the courses change.
+        :return: The Catalog of the courses
+        """
+        if self.storage is not None:
+            version = self.storage.courses_version()
+            if version != self.courses_version:
+                self.courses_version = version
+                self.reload_courses(self.storage.read_courses())
+        if self.course_catalog is None:
+            self.course_catalog = Catalog(self.courses)
+        return self.course_catalog
+
+    def reload_courses(self, courses):
+        """
+        This replaces the courses and the indexes built from them
+        :param courses: This is the list of the courses
+        """
+        self.courses = courses
+        self.courses_by_id = {course.course_id: course for course in courses}
+        # Cached schedules and the listing hold the old course records
+        self.schedules.clear()
+        self.course_catalog = None
+
+    def add_student(self, student):
+        """
+        This adds a student to the students list and to the student index
+        :param student: This is the student record
+        """
+        self.students.append(student)
+        self.index_student(student)
+
+    def index_student(self, student):
+        """
+        This adds a student to the student id, login and name prefix indexes
+        :param student: This is the student record
+        """
+        self.students_by_id[student.student_id] = student
+        login = student.student_id.lower()
+        self.students_by_login[login] = student
+        prefix, number = STUDENT_ID_PATTERN.fullmatch(login).groups()
+        if number:
+            self.next_student_number[prefix] = max(self.next_student_number.get(prefix, 0), int(number) + 1)
+
+    def find_student(self, student_id):
+        """
+        This looks a student up by id, ignoring case
+        :param student_id: This is the student id as the user typed it
+        :return: The student record, or None if there is no such student
+        """
+        return self.students_by_login.get(student_id.strip().lower())
+
+    def next_student_id(self, first_name, last_name):
+        """
+        This returns a new student id from the first initial, the last name and the next free number for them.
+        The number is past every id already using the same prefix, in any case.
+        :param first_name: This is the first name of the student
+        :param last_name: This is the last name of the student
+        :return: The new student id
+        """
+        prefix = f"{first_name[0]}{last_name}"
+        student_id = f"{prefix}{self.next_student_number.get(prefix.lower(), 0)}"
+        # Guard against ids in the students file that were not made by this scheme
+        while student_id.lower() in self.students_by_login:
+            self.next_student_number[prefix.lower()] = self.next_student_number.get(prefix.lower(), 0) + 1
+            student_id = f"{prefix}{self.next_student_number[prefix.lower()]}"
+        return student_id
+
+    def save_student(self, student):
+        """
+        This saves a student that has already been added to the registry to the storage backend
+        :param student: This is the student record
+        """
+        if self.storage is not None:
+            self.storage.save_student(self, student)
+
+    def save_registration(self, operation, student_id, course_id):
+        """
+        This saves a register or drop that has already been applied to the registry to the storage backend
+        :param operation: This is '+' for a registration and '-' for a drop
+        :param student_id: This is the student id
+        :param course_id: This is the course id
+        """
+        if self.storage is not None:
+            self.storage.save_registration(self, operation, student_id, course_id)
+
+    def save_registrations(self, changes):
+        """
+        This saves a batch of registers and drops that have already been applied to the registry with one write
+        :param changes: This is the list of (operation, student_id, course_id) that were applied
+        """
+        if self.storage is not None and changes:
+            self.storage.save_registrations(self, changes)
+
+    def student(self, student_id):
+        """
+        This looks up a student by id
+        :param student_id: This is the student id
+        :return: The student record, or None if the student does not exist
+        """
+        return self.students_by_id.get(student_id)
+
+    def course(self, course_id):
+        """
+        This looks up a course by its ticket number
+        :param course_id: This is the course id, either as an int or as the ticket number string that was entered
+        :return: The course record, or None if the course does not exist
+        """
+        try:
+            return self.courses_by_id.get(int(course_id))
+        except ValueError:
+            return None
+
+    def is_registered(self, student_id, course_id):
+        """
+        This checks if a student is registered for a course
+        :param student_id: This is the student id
+        :param course_id: This is the course id
+        :return: True if the student is registered for the course
+        """
+        self.load_pending()
+        return course_id in self.registrations_by_student.get(student_id, ())
+
+    def student_courses(self, student_id):
+        """
+        This returns the courses a student is registered for, in registration order
+        :param student_id: This is the student id
+        :return: The list of course records
+        """
+        return [*self.schedule(student_id).courses]
+
+    def schedule(self, student_id):
+        """
+        This returns the schedule of a student from the schedule cache, building it from the registration index on
+        a miss and evicting the least recently used schedule when the cache is full. The schedule is shared with
+        the cache, so it must not be changed by the caller.
+        :param student_id: This is the student id
+        :return: The Schedule of the student
+        """
+        self.load_pending()
+        schedule = self.schedules.get(student_id)
+        if schedule is not None:
+            self.schedules.move_to_end(student_id)
+            return schedule
+
+        student_courses = []
+        for course_id in self.registrations_by_student.get(student_id, {}):
+            course = self.courses_by_id.get(course_id)
+            if course is not None:
+                student_courses.append(course)
+        schedule = self.schedules[student_id] = Schedule(student_courses)
+        if len(self.schedules) > self.schedule_cache_size:
+            self.schedules.popitem(last=False)
+        return schedule
+
+    def course_students(self, course_id):
+        """
+        This returns the students registered for a course, in registration order
+        :param course_id: This is the course id
+        :return: The list of student records
+        """
+        self.load_pending()
+        course_students = []
+        for student_id in self.registrations_by_course.get(course_id, {}):
+            student = self.students_by_id.get(student_id)
+            if student is not None:
+                course_students.append(student)
+        return course_students
+
+    def seats(self, course_id):
+        """
+        This returns the number of seats taken in a course
+        :param course_id: This is the course id
+        :return: The number of seats taken
+        """
+        self.load_pending()
+        return self.seats_taken.get(course_id, 0)
+
+    def is_waiting(self, student_id, course_id):
+        """
+        This checks if a student is on the waitlist of a course
+        :param student_id: This is the student id
+        :param course_id: This is the course id
+        :return: True if the student is waiting for the course
+        """
+        self.load_pending()
+        return student_id in self.waiting.get(course_id, ())
+
+    def waitlist_length(self, course_id):
+        """
+        This returns the number of students on the waitlist of a course
+        :param course_id: This is the course id
+        :return: The number of students waiting
+        """
+        self.load_pending()
+        return len(self.waiting.get(course_id, ()))
+
+    def join_waitlist(self, student_id, course_id, front=False):
+        """
+        This puts a student at the back of the waitlist of a course. Joining a waitlist the student is already on
+        does nothing.
+        :param student_id: This is the student id
+        :param course_id: This is the course id
+        :param front: This is True to put the student at the front instead, e.g. to undo a promotion
+        :return: True if the student joined the waitlist
+        """
+        waiting = self.waiting.setdefault(course_id, {})
+        if student_id in waiting:
+            return False
+        ticket = waiting[student_id] = next(self.waitlist_tickets)
+        waitlist = self.waitlists.setdefault(course_id, deque())
+        if front:
+            waitlist.appendleft((ticket, student_id))
+        else:
+            waitlist.append((ticket, student_id))
+        return True
+
+    def leave_waitlist(self, student_id, course_id):
+        """
+        This takes a student off the waitlist of a course
+        :param student_id: This is the student id
+        :param course_id: This is the course id
+        :return: True if the student was on the waitlist
+        """
+        waiting = self.waiting.get(course_id, {})
+        if waiting.pop(student_id, None) is None:
+            return False
+        waitlist = self.waitlists[course_id]
+        if len(waitlist) > 2 * len(waiting):
+            # Rebuilding once half the entries are stale keeps the deque within twice the students waiting, at a
+            # constant cost per student who left
+            self.waitlists[course_id] = deque(entry for entry in waitlist if waiting.get(entry[1]) == entry[0])
+        return True
+
+    def next_waiting(self, course_id):
+        """
+        This takes the student at the front of the waitlist of a course off the waitlist
+        :param course_id: This is the course id
+        :return: The student id, or None if nobody is waiting
+        """
+        self.load_pending()
+        waitlist = self.waitlists.get(course_id)
+        waiting = self.waiting.get(course_id)
+        while waitlist:
+            ticket, student_id = waitlist.popleft()
+            # Entries of students who left, or left and joined again further back, are skipped
+            if waiting.get(student_id) == ticket:
+                del waiting[student_id]
+                return student_id
+        return None
+
+    def revert(self, changes):
+        """
+        This undoes changes that were applied to the registry but could not be saved, last change first
+        :param changes: This is the list of (operation, student_id, course_id) that were applied
+        """
+        for operation, student_id, course_id in reversed(changes):
+            if operation == "+":
+                self.remove_registration(student_id, course_id)
+            elif operation == "-":
+                self.add_registration(student_id, course_id)
+            elif operation == "w":
+                self.leave_waitlist(student_id, course_id)
+            else:
+                # A promoted student came off the front, and a student who left on their own is at least not moved back
+                self.join_waitlist(student_id, course_id, front=True)
+
+    def add_registration(self, student_id, course_id):
+        """
+        This adds a registration to every index. Adding a registration that already exists does nothing.
+        :param student_id: This is the student id
+        :param course_id: This is the course id
+        :return: True if the registration was added
+        """
+        if self.is_registered(student_id, course_id):
+            return False
+        self.index_registration(Registration(student_id, course_id))
+        return True
+
+    def index_registration(self, registration):
+        """
+        This adds a registration record to every index, replacing an equal registration that is already there
+        :param registration: This is the registration record
+        """
+        student_id, course_id = registration.student_id, registration.course_id
+        student_registrations = self.registrations_by_student.setdefault(student_id, {})
+        if course_id not in student_registrations:
+            self.seats_taken[course_id] = self.seats_taken.get(course_id, 0) + 1
+            # Keep a cached schedule in step with the index
+            schedule = self.schedules.get(student_id)
+            course = self.courses_by_id.get(course_id)
+            if schedule is not None and course is not None:
+                schedule.add(course)
+        student_registrations[course_id] = registration
+        self.registrations_by_course.setdefault(course_id, {})[student_id] = registration
+
+    def remove_registration(self, student_id, course_id):
+        """
+        This removes a registration from every index
+        :param student_id: This is the student id
+        :param course_id: This is the course id
+        :return: True if the registration existed and was removed
+        """
+        self.load_pending()
+        return self.unindex_registration(student_id, course_id)
+
+    def unindex_registration(self, student_id, course_id):
+        """
+        This removes a registration from every index without loading deferred registrations first
+        :param student_id: This is the student id
+        :param course_id: This is the course id
+        :return: True if the registration existed and was removed
+        """
+        if course_id not in self.registrations_by_student.get(student_id, ()):
+            return False
+        del self.registrations_by_student[student_id][course_id]
+        del self.registrations_by_course[course_id][student_id]
+        self.seats_taken[course_id] -= 1
+        schedule = self.schedules.get(student_id)
+        course = self.courses_by_id.get(course_id)
+        if schedule is not None and course is not None:
+            schedule.remove(course)
+        return True
+
+    @staticmethod
+    def count_seats(registrations):
+        """
+        This counts the seats taken in each course by scanning a list of registrations
+        :param registrations: This is the list of registration records, e.g. from read_registrations
+        :return: A dictionary of course id -> number of seats taken
+        """
+        counts = {}
+        for key in {(registration.student_id, registration.course_id) for registration in registrations}:
+            counts[key[1]] = counts.get(key[1], 0) + 1
+        return counts
+
+    def verify_seat_counts(self, registrations):
+        """
+        This compares the seat counters with the seats counted from a list of registrations
+        :param registrations: This is the list of registration records, e.g. from read_registrations
+        :return: A dictionary of course id -> (counter value, counted value) for every course that does not match
+        """
+        self.load_pending()
+        counts = self.count_seats(registrations)
+        mismatches = {}
+        for course_id in set(counts) | set(self.seats_taken):
+            taken = self.seats_taken.get(course_id, 0)
+            if taken != counts.get(course_id, 0):
+                mismatches[course_id] = (taken, counts.get(course_id, 0))
+        return mismatches
+
+    def rebuild_seat_counts(self, registrations):
+        """
+        This rebuilds the registration indexes and the seat counters from a list of registrations, e.g. the ones
+        read back from the registrations csv file after the counters were found not to match it
+        :param registrations: This is the list of registration records
+        """
+        self.load_pending()
+        self.registrations_by_student = {}
+        self.registrations_by_course = {}
+        self.seats_taken = {}
+        # Cached schedules were built from the old indexes
+        self.schedules.clear()
+        for registration in registrations:
+            self.index_registration(registration)
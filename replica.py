@@ -0,0 +1,234 @@
+#! /usr/bin/env python3
+"""
+desc: This module contains the read replicas the server answers info, list and detail from when it is started with
+--readers. The server process stays the only writer: every register and drop is appended to the registration
+journal before it is answered, and every compaction rewrites the registrations csv file and the binary snapshot.
+Each reader process loads its own Registry from the snapshot (or the csv files) and the journal, and then follows
+the journal and the students csv file from where it stopped reading, applying only complete lines. A reader brings
+itself up to date before answering when it last did so more than max_staleness seconds ago, so an answer never
+misses a change that was answered more than max_staleness seconds before it was asked for. A compaction seals the
+journal and starts a new segment whose header names the one it follows (see data_utils.seal_journal), so a reader
+finishes the sealed segment from where it stopped and goes on with the new one instead of loading everything
+again. Only a reader that missed a whole segment, e.g. one left idle across two compactions, loads again.
+"""
+import csv
+import os
+import time
+
+import data_utils
+from registry import Registry
+from snapshot import file_stamp
+from storage import CsvStorage
+
+# The number of seconds a reader may answer without looking for new changes
+MAX_STALENESS = 0.1
+READ_COMMANDS = ("info", "list", "detail")
+
+
+def read_lines(registry, command, arguments):
+    """
+    This answers one of the read-only commands
+    :param registry: This is the registry to answer from
+    :param command: This is the command, in lower case
+    :param arguments: This is the list of the command's arguments
+    :return: The list of lines to send back, or None if the command is not a valid read-only command
+    """
+    if command == "info" and len(arguments) == 1:
+        # Student ids are matched in any case
+        student = registry.find_student(arguments[0])
+        return data_utils.info_lines(registry, student.student_id if student is not None else arguments[0])
+    elif command == "list":
+        options = data_utils.listing_options(arguments)
+        if options is None:
+            return ["Options are code=PREFIX, day=DAY, instructor=NAME, page=N and size=N."]
+        return data_utils.listing_lines(registry.catalog(), **options)
+    elif command == "detail" and len(arguments) == 1:
+        course = registry.course(arguments[0])
+        if course is None:
+            return [f"{arguments[0]} not found."]
+        return data_utils.detail_lines(registry, course)
+    return None
+
+
+def read_new_lines(file_path, offset):
+    """
+    This reads the complete lines a file has past an offset. A line the writer has not finished is left for the
+    next read.
+    :param file_path: The path to the file
+    :param offset: This is the byte offset to read from
+    :return: A tuple of (list of lines, offset after the last complete line), or ([], 0) if the file does not
+    exist
+    """
+    try:
+        with open(file_path, "rb") as file:
+            return read_complete_lines(file, offset)
+    except FileNotFoundError:
+        return [], 0
+
+
+def read_segment(file_path, offset):
+    """
+    This reads the header of a journal segment and the complete lines it has past an offset, from the same open
+    file so both belong to the same segment
+    :param file_path: The path to the journal segment
+    :param offset: This is the byte offset to read from
+    :return: A tuple of (generation of the segment it follows, its generation, list of lines, offset after the
+    last complete line), or None if the segment does not exist
+    """
+    try:
+        with open(file_path, "rb") as file:
+            previous, generation = data_utils.parse_journal_header(file.readline().decode())
+            return (previous, generation, *read_complete_lines(file, offset))
+    except FileNotFoundError:
+        return None
+
+
+def read_complete_lines(file, offset):
+    """
+    This reads the complete lines an open file has past an offset
+    :param file: This is the file, open in binary mode
+    :param offset: This is the byte offset to read from
+    :return: A tuple of (list of lines, offset after the last complete line)
+    """
+    file.seek(offset)
+    data = file.read()
+    end = data.rfind(b"\n") + 1
+    return data[:end].decode().splitlines(), offset + end
+
+
+class Replica:
+    """
+    This is the registry of one reader process, together with how far it has read the journal and the students csv
+    file
+    """
+
+    def __init__(self, max_staleness=MAX_STALENESS):
+        """
+        :param max_staleness: This is the number of seconds the registry may answer without looking for new changes
+        """
+        self.max_staleness = max_staleness
+        self.registry = None
+        self.load()
+
+    def load(self):
+        """
+        This loads the registry from the snapshot or the csv files and the journal. The load is repeated if the
+        registrations csv file was compacted while it was being read.
+        """
+        registrations_path = data_utils.REGISTRATION_FILENAME
+        while True:
+            registrations_stamp = file_stamp(registrations_path)
+            if self.registry is not None:
+                self.registry.storage.close()
+            storage = CsvStorage()
+            if storage.snapshot is not None:
+                students = storage.snapshot.read_students()
+                self.students_offset = storage.snapshot.students_size
+                changes = storage.snapshot.iter_registrations()
+            else:
+                students = []
+                self.students_offset = 0
+                changes = data_utils.iter_registration_rows(registrations_path)
+            self.registry = Registry(students, storage.read_courses(), (), data_utils.read_policy(), storage)
+            self.registry.courses_version = storage.courses_version()
+            self.registry.load_registrations(changes)
+            self.registry.load_registrations(data_utils.iter_waitlist(registrations_path))
+            self.journal_offset = 0
+            # The reader takes up whichever segment is current
+            self.journal_generation = None
+            self.read_students()
+            self.read_journal()
+            if file_stamp(registrations_path) == registrations_stamp:
+                break
+        self.refreshed = time.monotonic()
+
+    def read_students(self):
+        """
+        This adds the students appended to the students csv file since it was last read
+        """
+        lines, self.students_offset = read_new_lines(data_utils.FILENAME, self.students_offset)
+        for student in data_utils.parse_students(csv.reader(lines, delimiter="\t")):
+            self.registry.add_student(student)
+
+    def read_journal(self):
+        """
+        This applies the changes appended to the journal since it was last read. If the journal was compacted
+        since, the rest of the sealed segment is applied first and the new segment is read from its start.
+        :return: False if a segment was compacted that the registry has not read, and it has to be loaded again
+        """
+        journal_path = data_utils.journal_path(data_utils.REGISTRATION_FILENAME)
+        while True:
+            segment = read_segment(journal_path, self.journal_offset)
+            if segment is None:
+                # There is no journal before the first change, and a compaction never removes it
+                if self.journal_generation is None:
+                    self.journal_generation = ""
+                return self.journal_generation == "" and self.journal_offset == 0
+            previous, generation, lines, offset = segment
+            if self.journal_generation is None or generation == self.journal_generation:
+                self.apply_journal(lines)
+                self.journal_generation, self.journal_offset = generation, offset
+                return True
+            if previous != self.journal_generation:
+                return False
+            sealed = read_segment(data_utils.sealed_journal_path(data_utils.REGISTRATION_FILENAME),
+                                  self.journal_offset)
+            if sealed is not None and sealed[1] == self.journal_generation:
+                self.apply_journal(sealed[2])
+            elif sealed is not None or self.journal_generation or self.journal_offset:
+                # The sealed segment is a later one, so the changes at the end of this one were missed
+                return False
+            # The current segment may itself have been sealed by now, which the next pass finds
+            self.journal_generation, self.journal_offset = generation, 0
+
+    def apply_journal(self, lines):
+        """
+        This applies lines read from the journal
+        :param lines: This is the list of complete journal lines
+        """
+        self.registry.load_registrations(data_utils.parse_journal(csv.reader(lines, delimiter="\t")))
+
+    def refresh(self):
+        """
+        This brings the registry up to date if it was last brought up to date more than max_staleness seconds ago
+        """
+        if time.monotonic() - self.refreshed < self.max_staleness:
+            return
+        self.read_students()
+        if not self.read_journal():
+            self.load()
+            return
+        self.refreshed = time.monotonic()
+
+
+# The replica of this reader process, set up by start_reader
+replica = None
+
+
+def start_reader(max_staleness=MAX_STALENESS):
+    """
+    This loads the replica of a reader process; it is the initializer of the server's process pool
+    :param max_staleness: This is the number of seconds the replica may answer without looking for new changes
+    """
+    global replica
+    replica = Replica(max_staleness)
+
+
+def ready():
+    """
+    This is run once in every reader process when the server starts, so the replicas are loaded before the first
+    command arrives
+    :return: The process id of the reader
+    """
+    return os.getpid()
+
+
+def execute(words):
+    """
+    This answers a read-only command in a reader process
+    :param words: This is the command, in lower case, followed by its arguments
+    :return: The list of lines to send back
+    """
+    replica.refresh()
+    lines = read_lines(replica.registry, words[0], words[1:])
+    return lines if lines is not None else ["Invalid selection, please try again."]
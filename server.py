@@ -0,0 +1,276 @@
+#! /usr/bin/env python3
+"""
+desc: This module runs the registration system as an asyncio server so that many students can be served by one
+process. Clients connect over TCP or a Unix socket and send one command per line:
+
+    info <student id>
+    list
+    detail <ticket #>
+    register <student id> <ticket #>
+    drop <student id> <ticket #>
+    stats
+    exit
+
+Every response is the lines the interactive menu would print, followed by a line containing only ".".
+All sessions share one Registry. A registration holds the student's lock and the course's lock until it has been
+written to the journal, so two students cannot both take the last seat of a course and one student cannot exceed
+their unit limit with two registrations sent at the same time. A drop promotes students from the course's waitlist
+under the same course lock, and the promotions are written in the same journal append as the drop.
+
+With --readers N, info, list and detail are answered by a pool of N reader processes instead, each following the
+journal the server writes (see replica.py), so reads use more than one core. A reader may answer up to
+--max-staleness seconds behind the writer. With --flush-window, registrations and drops are written to the journal
+by a background thread that gathers the changes of that many seconds into one write, so a change may be answered
+up to that long before it is on disk. Readers only see what is on disk, so --flush-window cannot be used with
+--readers.
+"""
+import argparse
+import asyncio
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import data_utils
+import metrics
+import replica
+from registry import Registry
+from storage import FLUSH_WINDOW, SYNC_EVERY, open_storage
+
+END_OF_RESPONSE = "."
+
+
+class RegistrationServer:
+    """
+    This serves the info/list/detail/register/drop commands to any number of concurrent sessions
+    """
+
+    def __init__(self, registry, readers=0, max_staleness=replica.MAX_STALENESS):
+        """
+        :param registry: This is the registry shared by every session
+        :param readers: This is the number of reader processes answering info, list and detail, or 0 to answer
+        them from the registry
+        :param max_staleness: This is the number of seconds a reader may answer without looking for new changes
+        """
+        self.registry = registry
+        self.course_locks = defaultdict(asyncio.Lock)
+        self.student_locks = defaultdict(asyncio.Lock)
+        # One writer thread, so journal appends and compactions never run at the same time
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.readers = readers
+        self.replicas = None
+        if readers:
+            # Started fresh rather than forked, since the server process already runs the writer thread
+            self.replicas = ProcessPoolExecutor(readers, multiprocessing.get_context("spawn"),
+                                                initializer=replica.start_reader, initargs=(max_staleness,))
+
+    async def handle_client(self, reader, writer):
+        """
+        This reads commands from one session until it disconnects or sends 'exit'
+        :param reader: This is the stream the commands are read from
+        :param writer: This is the stream the responses are written to
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                words = line.decode().split()
+                if words and words[0].lower() == "exit":
+                    writer.write(f"Session ended.\n{END_OF_RESPONSE}\n".encode())
+                    await writer.drain()
+                    break
+                try:
+                    lines = await self.execute(words)
+                except Exception as error:
+                    # The session stays open; a change that could not be saved has been reverted
+                    lines = [f"The command failed: {error}"]
+                lines.append(END_OF_RESPONSE)
+                writer.write(("\n".join(lines) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def execute(self, words):
+        """
+        This runs one command
+        :param words: This is the command followed by its arguments
+        :return: The list of lines to send back
+        """
+        command = words[0].lower() if words else ""
+        arguments = words[1:]
+        if command in replica.READ_COMMANDS:
+            if self.replicas is not None:
+                return await asyncio.get_running_loop().run_in_executor(self.replicas, replica.execute,
+                                                                        [command, *arguments])
+            lines = replica.read_lines(self.registry, command, arguments)
+            if lines is not None:
+                return lines
+        elif command in ("register", "drop") and len(arguments) == 2:
+            # Student ids are matched in any case, so the student lock is always taken on the stored id
+            student = self.registry.find_student(arguments[0])
+            if student is None:
+                return [f"{arguments[0]} not found."]
+            arguments[0] = student.student_id
+        if command == "register" and len(arguments) == 2:
+            return [await self.register(*arguments)]
+        elif command == "drop" and len(arguments) == 2:
+            return [await self.drop(*arguments)]
+        elif command == "stats" and not arguments:
+            return metrics.report_lines()
+        return ["Invalid selection, please try again."]
+
+    async def register(self, student_id, ticket_number):
+        """
+        This registers a student for a course, or puts them on its waitlist, while holding the student's and the
+        course's locks
+        :param student_id: This is the student id
+        :param ticket_number: This is the ticket number of the course
+        :return: The message describing the result
+        """
+        course = self.registry.course(ticket_number)
+        if course is None:
+            return f"{ticket_number} not found."
+
+        # The student lock is always taken before the course lock, so two sessions cannot deadlock
+        async with self.student_locks[student_id], self.course_locks[course.course_id]:
+            _, message, changes = data_utils.apply_register(self.registry, student_id, course)
+            await self.save(changes)
+        return message
+
+    async def drop(self, student_id, ticket_number):
+        """
+        This drops a student from a course while holding the student's and the course's locks. The students
+        promoted from the waitlist into the free seat are saved in the same write as the drop.
+        :param student_id: This is the student id
+        :param ticket_number: This is the ticket number of the course
+        :return: The message describing the result
+        """
+        course = self.registry.course(ticket_number)
+        if course is None:
+            return f"{ticket_number} not found."
+
+        async with self.student_locks[student_id], self.course_locks[course.course_id]:
+            _, message, changes = data_utils.apply_drop(self.registry, student_id, course)
+            await self.save(changes)
+        return message
+
+    async def save(self, changes):
+        """
+        This saves changes that were applied to the registry on the writer thread, and undoes them if they cannot
+        be saved. When the journal has grown large enough, it is compacted afterwards.
+        :param changes: This is the list of (operation, student_id, course_id) that were applied
+        """
+        if not changes:
+            return
+        storage = self.registry.storage
+        if storage is None:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            compact = await loop.run_in_executor(self.writer, storage.append_registrations, changes)
+        except Exception:
+            # The seat is given back before anyone else can check the course
+            self.registry.revert(changes)
+            raise
+        if compact:
+            # The rows are gathered here on the event loop, since the sessions keep changing the registry while the
+            # writer thread runs. Changes applied after this point are appended to the journal after the compaction.
+            rows = storage.compaction_rows(self.registry)
+            try:
+                await loop.run_in_executor(self.writer, storage.write_compaction, rows)
+            except OSError as error:
+                # The changes are already in the journal, so the compaction is only tried again on the next save
+                print(f"Compaction failed: {error}")
+
+    async def start(self, host=None, port=None, path=None):
+        """
+        This starts listening on a TCP port, or on a Unix socket if a path is given
+        :param host: This is the host to listen on
+        :param port: This is the TCP port to listen on
+        :param path: This is the path of the Unix socket to listen on
+        :return: The asyncio server
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_client, path=path)
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    async def start_readers(self):
+        """
+        This starts every reader process and waits until each has loaded its replica
+        """
+        if self.replicas is not None:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(self.replicas, replica.ready) for _ in range(self.readers)))
+
+    def close(self):
+        """
+        This stops the reader processes and the writer thread
+        """
+        if self.replicas is not None:
+            self.replicas.shutdown()
+        self.writer.shutdown()
+
+
+async def serve(host, port, path, database_path, readers=0, max_staleness=replica.MAX_STALENESS,
+                flush_window=FLUSH_WINDOW):
+    """
+    This loads the csv files (or the database) and serves requests until the process is stopped
+    :param host: This is the host to listen on
+    :param port: This is the TCP port to listen on
+    :param path: This is the path of the Unix socket to listen on
+    :param database_path: The path to a SQLite database, or None to use the csv files
+    :param readers: This is the number of reader processes answering info, list and detail
+    :param max_staleness: This is the number of seconds a reader may answer without looking for new changes
+    :param flush_window: This is the number of seconds changes are gathered for before they are written, or None
+    to write every change as it is saved
+    """
+    storage = open_storage(database_path, SYNC_EVERY, flush_window)
+    registry = Registry.from_storage(storage, data_utils.read_policy())
+    registration_server = RegistrationServer(registry, readers, max_staleness)
+    try:
+        await registration_server.start_readers()
+        server = await registration_server.start(host, port, path)
+        async with server:
+            print(f"Serving on {', '.join(str(sock.getsockname()) for sock in server.sockets)}")
+            await server.serve_forever()
+    finally:
+        registration_server.close()
+        storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Saddleback College Registration server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--database", help="use this SQLite database instead of the csv files")
+    parser.add_argument("--readers", type=int, default=0,
+                        help="answer info, list and detail from this many reader processes (csv files only)")
+    parser.add_argument("--max-staleness", type=float, default=replica.MAX_STALENESS,
+                        help="seconds a reader may answer without looking for new changes")
+    parser.add_argument("--flush-window", type=float, default=FLUSH_WINDOW, metavar="SECONDS",
+                        help="write changes in the background, gathering this many seconds of them per write "
+                             "(csv files only, not with --readers)")
+    parser.add_argument("--metrics", action="store_true", help="record timing statistics for the stats command")
+    parser.add_argument("--metrics-dump", metavar="FILE", help="also write the statistics to this JSON file")
+    parser.add_argument("--metrics-interval", type=float, default=60.0, help="seconds between statistics dumps")
+    args = parser.parse_args()
+    if args.readers and args.database:
+        parser.error("--readers follows the csv files and cannot be used with --database")
+    if args.flush_window is not None and args.database:
+        parser.error("--flush-window writes the csv files and cannot be used with --database")
+    if args.flush_window is not None and args.readers:
+        parser.error("--flush-window delays the journal the readers follow and cannot be used with --readers")
+    if args.metrics or args.metrics_dump:
+        metrics.enable(args.metrics_dump, args.metrics_interval)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.database, args.readers, args.max_staleness,
+                          args.flush_window))
+    except KeyboardInterrupt:
+        print("Server stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#! /usr/bin/env python3
+"""
+desc: This module contains the binary snapshot of the csv files that CsvStorage starts from instead of parsing
+them. The snapshot has fixed-width student, course and registration tables whose text fields are indexes into a
+string table, and it is opened with mmap, so loading it unpacks numbers instead of splitting, stripping and
+converting every field. It is written after each compaction of the registration journal, and it records the size
+and modification time of the csv files it was written from: when they no longer match, the snapshot is ignored and
+the csv files are read as before. Students appended since the snapshot are read from the end of the students csv
+file, and the journal is replayed on top of the snapshot, as it is on top of the registrations csv file. The csv
+files stay the import and export format. Running this module writes a snapshot of the csv files:
+
+    python snapshot.py
+"""
+import mmap
+import os
+import struct
+import zlib
+
+import data_utils
+from records import Course, Registration, Student
+from registry import Registry
+
+SNAPSHOT_FILENAME = "registration.snapshot"
+MAGIC = b"REGSNAP1"
+
+# magic, number of strings, students, courses and registrations, then the stamps of the csv files: courses and
+# registrations (modification time, size), students (size, crc32 of the bytes before that size)
+HEADER = struct.Struct("<8s4Iqqqq qI")
+# student id, last name and first name, as string indexes
+STUDENT = struct.Struct("<3I")
+# course id and credit hours, then code, name, day, time and instructor as string indexes
+COURSE = struct.Struct("<id5I")
+# student id as a string index, course id
+REGISTRATION = struct.Struct("<Ii")
+# The strings of the string table are separated by NUL characters, which cannot appear in a csv field
+SEPARATOR = "\0"
+# The number of bytes at the end of the students csv file covered by the checksum
+CHECKSUM_BYTES = 4096
+
+
+def students_stamp(file_path):
+    """
+    This stamps the students csv file by its size and a checksum of its last bytes. Appending students keeps the
+    stamp of the part that was already there valid.
+    :param file_path: The path to the students csv file
+    :return: A tuple of (size, crc32)
+    """
+    size = os.path.getsize(file_path)
+    return size, checksum(file_path, size)
+
+
+def checksum(file_path, size):
+    """
+    This computes the checksum of the last bytes before an offset of a file
+    :param file_path: The path to the file
+    :param size: This is the offset
+    :return: The crc32 of up to CHECKSUM_BYTES bytes before the offset
+    """
+    with open(file_path, "rb") as file:
+        file.seek(max(0, size - CHECKSUM_BYTES))
+        return zlib.crc32(file.read(size - file.tell()))
+
+
+def file_stamp(file_path):
+    """
+    :return: A tuple of (modification time in nanoseconds, size) of a file
+    """
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def write_snapshot(students, courses, registrations, students_path=data_utils.FILENAME,
+                   courses_path=data_utils.COURSES_FILENAME, registrations_path=data_utils.REGISTRATION_FILENAME,
+                   file_path=SNAPSHOT_FILENAME):
+    """
+    This writes the binary snapshot of the csv files. The rows must be the ones the csv files hold, so it is called
+    right after the registrations csv file has been written and the students csv file has been flushed.
+    :param students: This is the list of the students
+    :param courses: This is the list of the courses
+    :param registrations: This is the list of registration records
+    :param students_path: The path to the students csv file
+    :param courses_path: The path to the courses csv file
+    :param registrations_path: The path to the registrations csv file
+    :param file_path: The path to the snapshot
+    """
+    strings = {}
+
+    def string(value):
+        # Every distinct string is stored once, so a student id shared by many registrations costs one entry
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    student_rows = b"".join(
+        STUDENT.pack(string(student.student_id), string(student.last_name), string(student.first_name))
+        for student in students)
+    course_rows = b"".join(
+        COURSE.pack(course.course_id, course.credit_hours, string(course.course_code), string(course.course_name),
+                    string(course.day), string(course.time), string(course.instructor))
+        for course in courses)
+    registration_rows = b"".join(
+        REGISTRATION.pack(string(registration.student_id), registration.course_id) for registration in registrations)
+
+    header = HEADER.pack(MAGIC, len(strings), len(students), len(courses), len(registrations),
+                         *file_stamp(courses_path), *file_stamp(registrations_path), *students_stamp(students_path))
+    # Written next to the snapshot, synced and renamed over it, so a reader or a crash never leaves half a snapshot
+    temporary_path = file_path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(header)
+        file.write(student_rows)
+        file.write(course_rows)
+        file.write(registration_rows)
+        file.write(SEPARATOR.join(strings).encode())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, file_path)
+    data_utils.sync_directory(file_path)
+
+
+class Snapshot:
+    """
+    This is an open binary snapshot. The tables are unpacked straight from the memory-mapped file, and the string
+    table is decoded in one piece the first time a string is needed.
+    """
+
+    def __init__(self, file_path=SNAPSHOT_FILENAME):
+        """
+        :param file_path: The path to the snapshot
+        """
+        with open(file_path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, string_count, self.student_count, self.course_count, self.registration_count,
+         courses_mtime, courses_size, registrations_mtime, registrations_size,
+         self.students_size, self.students_checksum) = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f"{file_path} is not a registration snapshot")
+        self.courses_stamp = (courses_mtime, courses_size)
+        self.registrations_stamp = (registrations_mtime, registrations_size)
+
+        self.string_count = string_count
+        self.view = view = memoryview(self.map)
+        position = HEADER.size
+        self.student_rows = view[position:position + STUDENT.size * self.student_count]
+        position += STUDENT.size * self.student_count
+        self.course_rows = view[position:position + COURSE.size * self.course_count]
+        position += COURSE.size * self.course_count
+        self.registration_rows = view[position:position + REGISTRATION.size * self.registration_count]
+        position += REGISTRATION.size * self.registration_count
+        self.string_bytes = position
+        self.string_table = None
+
+    def strings(self):
+        """
+        This decodes the string table, once
+        :return: The list of strings, by string index
+        """
+        if self.string_table is None:
+            self.string_table = self.map[self.string_bytes:].decode().split(SEPARATOR) if self.string_count else []
+        return self.string_table
+
+    def matches(self, students_path, courses_path, registrations_path):
+        """
+        This checks that the csv files are still the ones the snapshot was written from. The students csv file may
+        have had students appended since.
+        :param students_path: The path to the students csv file
+        :param courses_path: The path to the courses csv file
+        :param registrations_path: The path to the registrations csv file
+        :return: True if the snapshot can be used
+        """
+        try:
+            return (file_stamp(courses_path) == self.courses_stamp
+                    and file_stamp(registrations_path) == self.registrations_stamp
+                    and os.path.getsize(students_path) >= self.students_size
+                    and checksum(students_path, self.students_size) == self.students_checksum)
+        except OSError:
+            return False
+
+    def read_students(self):
+        """
+        :return: The list of Student records in the snapshot
+        """
+        strings = self.strings()
+        return [Student(strings[student_id], strings[last_name], strings[first_name])
+                for student_id, last_name, first_name in STUDENT.iter_unpack(self.student_rows)]
+
+    def read_courses(self):
+        """
+        :return: The list of Course records in the snapshot
+        """
+        strings = self.strings()
+        return [Course(course_id, strings[code], strings[name], credit_hours, strings[day], strings[time],
+                       strings[instructor])
+                for course_id, credit_hours, code, name, day, time, instructor in COURSE.iter_unpack(self.course_rows)]
+
+    def iter_registrations(self):
+        """
+        This streams the registrations in the snapshot
+        :return: A generator of ('+', Registration)
+        """
+        strings = self.strings()
+        for student_id, course_id in REGISTRATION.iter_unpack(self.registration_rows):
+            yield "+", Registration(strings[student_id], course_id)
+
+    def close(self):
+        """
+        This unmaps the snapshot
+        """
+        self.student_rows.release()
+        self.course_rows.release()
+        self.registration_rows.release()
+        self.view.release()
+        self.map.close()
+
+
+def open_snapshot(students_path=data_utils.FILENAME, courses_path=data_utils.COURSES_FILENAME,
+                  registrations_path=data_utils.REGISTRATION_FILENAME, file_path=SNAPSHOT_FILENAME):
+    """
+    This opens the snapshot if there is one and it still matches the csv files
+    :param students_path: The path to the students csv file
+    :param courses_path: The path to the courses csv file
+    :param registrations_path: The path to the registrations csv file
+    :param file_path: The path to the snapshot
+    :return: The Snapshot, or None if the csv files have to be read instead
+    """
+    try:
+        snapshot = Snapshot(file_path)
+    except (OSError, ValueError, struct.error):
+        return None
+    if not snapshot.matches(students_path, courses_path, registrations_path):
+        snapshot.close()
+        return None
+    return snapshot
+
+
+def main():
+    students = data_utils.read_students()
+    courses = data_utils.read_courses(data_utils.COURSES_FILENAME)
+    # The journal holds waitlist changes as well as registrations, so it is replayed into a registry
+    registry = Registry(students, courses, ())
+    registry.load_registrations(data_utils.iter_registration_changes(data_utils.REGISTRATION_FILENAME))
+    registrations = registry.registrations
+    # The snapshot has to match the registrations csv file, so the journal is compacted into it first
+    data_utils.write_registrations(registrations, waitlist=registry.waitlist_rows)
+    write_snapshot(students, courses, registrations)
+    print(f"Wrote {len(students)} students, {len(courses)} courses and {len(registrations)} registrations to "
+          f"{SNAPSHOT_FILENAME}.")
+
+
+if __name__ == "__main__":
+    main()
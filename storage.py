@@ -0,0 +1,633 @@
+#! /usr/bin/env python3
+"""
+desc: This module contains the storage backends the registry loads from and saves changes to. CsvStorage keeps
+the tab-separated csv files (with the registration journal); SqliteStorage keeps everything in one SQLite database
+in WAL mode, so a register or drop is a single-row transaction. Running this module imports the csv files into a
+SQLite database:
+
+    python storage.py registration.db
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import threading
+import time
+
+import data_utils
+from records import Course, Registration, Student
+from registry import Registry
+from snapshot import SNAPSHOT_FILENAME, open_snapshot, write_snapshot
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    student_id TEXT PRIMARY KEY,
+    last_name TEXT NOT NULL,
+    first_name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS courses (
+    course_id INTEGER PRIMARY KEY,
+    course_code TEXT NOT NULL,
+    course_name TEXT NOT NULL,
+    credit_hours REAL NOT NULL,
+    day TEXT NOT NULL,
+    time TEXT NOT NULL,
+    instructor TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS registrations (
+    student_id TEXT NOT NULL,
+    course_id INTEGER NOT NULL,
+    PRIMARY KEY (student_id, course_id)
+);
+CREATE INDEX IF NOT EXISTS registrations_course_id ON registrations (course_id);
+CREATE TABLE IF NOT EXISTS waitlist (
+    position INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    course_id INTEGER NOT NULL
+);
+"""
+
+# The number of new students appended to the students csv file between fsyncs; 1 syncs every add and 0 only
+# syncs when the storage is closed
+SYNC_EVERY = 1
+# The number of seconds the flusher gathers changes for before writing them together, or None to write every
+# change as it is saved
+FLUSH_WINDOW = None
+
+
+class RosterWriter:
+    """
+    This appends new students to the students csv file in the tab-separated format read_students parses, instead
+    of rewriting the whole file for every add. The file is kept open between adds and synced to disk according to
+    the fsync policy.
+    """
+
+    def __init__(self, file_path=data_utils.FILENAME, sync_every=SYNC_EVERY):
+        """
+        :param file_path: The path to the students csv file
+        :param sync_every: This is the number of appends between fsyncs, or 0 to sync only on close
+        """
+        self.file_path = file_path
+        self.sync_every = sync_every
+        self.file = None
+        self.writer = None
+        # The number of students appended since the last sync
+        self.unsynced = 0
+
+    def open(self):
+        """
+        This opens the students csv file for appending, ending its last row first if it has no newline
+        """
+        self.file = open(self.file_path, "a+", newline="")
+        if self.file.tell():
+            self.file.seek(self.file.tell() - 1)
+            if self.file.read(1) not in ("\n", "\r"):
+                self.file.write("\n")
+        self.writer = csv.writer(self.file, delimiter="\t", lineterminator="\n")
+
+    def append(self, student):
+        """
+        This appends one student, and syncs the file if the fsync policy calls for it
+        :param student: This is the student record
+        """
+        if self.file is None:
+            self.open()
+        self.writer.writerow([student.student_id, student.last_name, student.first_name])
+        self.unsynced += 1
+        if self.sync_every and self.unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        """
+        This flushes the appended students and fsyncs the students csv file
+        """
+        if self.file is not None and self.unsynced:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+
+    def close(self):
+        """
+        This syncs and closes the students csv file
+        """
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+
+class Flusher:
+    """
+    This writes registration changes and new students from a background thread. The first change saved opens a
+    window of flush_window seconds, and everything saved until the window closes is written with one append to the
+    journal and one to the students csv file, each followed by one fsync. A change is acknowledged before it is on
+    disk, and is on disk at most flush_window seconds plus the time of the write later.
+    """
+
+    def __init__(self, registrations_path, roster, flush_window):
+        """
+        :param registrations_path: The path to the registrations csv file
+        :param roster: This is the RosterWriter new students are appended with
+        :param flush_window: This is the number of seconds changes are gathered for before they are written
+        """
+        self.registrations_path = registrations_path
+        self.roster = roster
+        self.flush_window = flush_window
+        self.changes = []
+        self.students = []
+        # The error of the last failed background write, raised to the next caller
+        self.error = None
+        self.closed = False
+        # The number of writes, each of which may hold many changes
+        self.flushes = 0
+        self.condition = threading.Condition()
+        # Held while writing, so a flush, a compaction and the background thread never write at the same time
+        self.write_lock = threading.RLock()
+        self.thread = threading.Thread(target=self.run, name="flusher", daemon=True)
+        self.thread.start()
+
+    def add(self, changes=(), students=()):
+        """
+        This queues changes and new students for the next write
+        :param changes: This is the list of (operation, student_id, course_id) to append to the journal
+        :param students: This is the list of student records to append to the students csv file
+        """
+        with self.condition:
+            self.raise_error()
+            self.changes.extend(changes)
+            self.students.extend(students)
+            self.condition.notify()
+
+    def raise_error(self):
+        """
+        This raises the error of the last failed background write, once
+        """
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def run(self):
+        """
+        This is the background thread: it waits for a change, lets the window pass and writes everything queued
+        """
+        while True:
+            with self.condition:
+                while not (self.changes or self.students or self.closed):
+                    self.condition.wait()
+                if self.closed:
+                    return
+            time.sleep(self.flush_window)
+            try:
+                self.flush()
+            except OSError as error:
+                with self.condition:
+                    self.error = error
+
+    def flush(self):
+        """
+        This writes everything queued now. Changes that cannot be written are queued again for the next write.
+        """
+        with self.write_lock:
+            with self.condition:
+                changes, self.changes = self.changes, []
+                students, self.students = self.students, []
+            if not (changes or students):
+                return
+            try:
+                if changes:
+                    data_utils.journal_registrations(changes, self.registrations_path, sync=True)
+                    changes = []
+                if students:
+                    for student in students:
+                        self.roster.append(student)
+                    self.roster.sync()
+            except OSError:
+                with self.condition:
+                    self.changes[:0] = changes
+                    self.students[:0] = students
+                raise
+            self.flushes += 1
+
+    def close(self):
+        """
+        This stops the background thread and writes everything still queued
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+        self.flush()
+        with self.condition:
+            self.raise_error()
+
+
+class CsvStorage:
+    """
+    This stores the students, courses and registrations in the tab-separated csv files. When the binary snapshot
+    of the csv files is up to date, they are loaded from the snapshot instead of being parsed. With a flush window,
+    changes are written by a Flusher instead of as they are saved.
+    """
+
+    def __init__(self, students_path=data_utils.FILENAME, courses_path=data_utils.COURSES_FILENAME,
+                 registrations_path=data_utils.REGISTRATION_FILENAME, sync_every=SYNC_EVERY,
+                 snapshot_path=SNAPSHOT_FILENAME, flush_window=FLUSH_WINDOW):
+        """
+        :param students_path: The path to the students csv file
+        :param courses_path: The path to the courses csv file
+        :param registrations_path: The path to the registrations csv file
+        :param sync_every: This is the number of new students between fsyncs, or 0 to sync only on close; the
+        flusher syncs after every write instead
+        :param snapshot_path: The path to the binary snapshot, or None to always parse the csv files
+        :param flush_window: This is the number of seconds the flusher gathers changes for, or None to write every
+        change as it is saved
+        """
+        self.students_path = students_path
+        self.courses_path = courses_path
+        self.registrations_path = registrations_path
+        self.flusher = None
+        if flush_window is None:
+            self.roster = RosterWriter(students_path, sync_every)
+        else:
+            self.roster = RosterWriter(students_path, 0)
+            self.flusher = Flusher(registrations_path, self.roster, flush_window)
+            # The size the journal will have once everything queued is written, to know when to compact it
+            journal_path = data_utils.journal_path(registrations_path)
+            self.journal_size = os.path.getsize(journal_path) if os.path.exists(journal_path) else 0
+        # The journal size at which the journal is compacted, kept from the last compaction
+        self.compact_size = data_utils.compaction_threshold(registrations_path)
+        self.snapshot_path = snapshot_path
+        self.snapshot = None
+        if snapshot_path is not None:
+            self.snapshot = open_snapshot(students_path, courses_path, registrations_path, snapshot_path)
+
+    def load(self):
+        """
+        This reads the students, courses and registrations
+        :return: A tuple of (students, courses, registrations) in the shape the read functions return
+        """
+        return self.read_students(), self.read_courses(), data_utils.read_registrations(self.registrations_path)
+
+    def read_students(self):
+        """
+        :return: The list of Student records
+        """
+        if self.snapshot is not None:
+            # Students added since the snapshot was written are appended after the ones it holds
+            return self.snapshot.read_students() + data_utils.read_students(self.students_path,
+                                                                            self.snapshot.students_size)
+        return data_utils.read_students(self.students_path)
+
+    def read_courses(self):
+        """
+        :return: The list of Course records
+        """
+        if self.snapshot is not None and self.snapshot.matches(self.students_path, self.courses_path,
+                                                               self.registrations_path):
+            return self.snapshot.read_courses()
+        return data_utils.read_courses(self.courses_path)
+
+    def courses_version(self):
+        """
+        This returns a value that changes whenever the courses csv file is changed
+        :return: The modification time and size of the courses csv file, or None if it does not exist
+        """
+        try:
+            stat = os.stat(self.courses_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def iter_registration_changes(self):
+        """
+        This streams the registrations csv file, or the snapshot of it, followed by its journal
+        :return: A generator of (operation, Registration)
+        """
+        rows = self.snapshot.iter_registrations() if self.snapshot is not None else None
+        return data_utils.iter_registration_changes(self.registrations_path, rows)
+
+    def save_student(self, registry, student):
+        """
+        This saves a new student by appending it to the students csv file
+        :param registry: This is the registry holding the students
+        :param student: This is the student row that was added
+        """
+        if self.flusher is not None:
+            self.flusher.add(students=[student])
+            return
+        self.roster.append(student)
+
+    def save_registration(self, registry, operation, student_id, course_id):
+        """
+        This appends a register, drop or waitlist change to the registration journal, and compacts the journal
+        into the registrations csv file when it gets too large
+        :param registry: This is the registry holding the registrations
+        :param operation: This is '+' for a registration, '-' for a drop, 'w' for joining a waitlist and 'x' for
+        leaving one
+        :param student_id: This is the student id
+        :param course_id: This is the course id
+        """
+        if self.flusher is not None:
+            self.save_registrations(registry, [(operation, student_id, course_id)])
+            return
+        journal_size = data_utils.journal_registration(operation, student_id, course_id, self.registrations_path)
+        if journal_size >= self.compact_size:
+            self.compact(registry)
+
+    def save_registrations(self, registry, changes):
+        """
+        This saves a batch of changes with one append to the registration journal, so a drop and the promotions
+        from the waitlist it made possible are written together, and compacts the journal when it gets too large
+        :param registry: This is the registry holding the registrations
+        :param changes: This is the list of (operation, student_id, course_id) that were applied
+        """
+        if self.append_registrations(changes):
+            self.compact(registry)
+
+    def append_registrations(self, changes):
+        """
+        This appends a batch of changes to the registration journal (or queues them for the flusher) without
+        compacting it
+        :param changes: This is the list of (operation, student_id, course_id) that were applied
+        :return: True if the journal has grown large enough to be compacted
+        """
+        if self.flusher is not None:
+            self.flusher.add(changes)
+            self.journal_size += len(data_utils.journal_records(changes))
+            journal_size = self.journal_size
+        else:
+            journal_size = data_utils.journal_registrations(changes, self.registrations_path)
+        return journal_size >= self.compact_size
+
+    def flush(self):
+        """
+        This writes the changes the flusher has queued, if there is a flusher
+        """
+        if self.flusher is not None:
+            self.flusher.flush()
+
+    def compact(self, registry):
+        """
+        This rewrites the registrations csv file and the waitlist file from the registry, which seals the journal,
+        and then writes the binary snapshot of the csv files
+        :param registry: This is the registry holding the students, courses and registrations
+        """
+        self.write_compaction(self.compaction_rows(registry))
+
+    @staticmethod
+    def compaction_rows(registry):
+        """
+        This gathers the rows a compaction writes. It reads the registry's indexes, so it must run on the thread
+        that changes them; the rows can then be written on another thread.
+        :param registry: This is the registry holding the students, courses and registrations
+        :return: A tuple of (students, courses, registrations, waitlist rows)
+        """
+        return registry.students[:], registry.courses, registry.registrations, registry.waitlist_rows
+
+    def write_compaction(self, rows):
+        """
+        This writes the rows gathered by compaction_rows to the registrations csv file, the waitlist file and the
+        snapshot
+        :param rows: This is the tuple of (students, courses, registrations, waitlist rows)
+        """
+        if self.flusher is not None:
+            # The queued changes are already in the rows, so they are written before the journal is sealed
+            with self.flusher.write_lock:
+                self.flusher.flush()
+                self.write_rows(*rows)
+                self.journal_size = os.path.getsize(data_utils.journal_path(self.registrations_path))
+        else:
+            self.write_rows(*rows)
+
+    def write_rows(self, students, courses, registrations, waitlist):
+        """
+        This writes the registrations csv file, the waitlist file and the snapshot for write_compaction
+        :param students: This is the list of the students
+        :param courses: This is the list of the courses
+        :param registrations: This is the list of registration records
+        :param waitlist: This is the list of registration records of the students waiting, in waitlist order
+        """
+        data_utils.write_registrations(registrations, self.registrations_path, waitlist)
+        self.compact_size = data_utils.compaction_threshold(self.registrations_path)
+        if self.snapshot_path is not None:
+            # The snapshot must hold exactly the students in the file, including any the roster has not synced
+            self.roster.sync()
+            write_snapshot(students, courses, registrations, self.students_path, self.courses_path,
+                           self.registrations_path, self.snapshot_path)
+            # The snapshot the registry was loaded from no longer matches the registrations csv file
+            if self.snapshot is not None:
+                self.snapshot.close()
+                self.snapshot = None
+
+    def close(self):
+        """
+        This writes what the flusher has queued, syncs and closes the students csv file and unmaps the snapshot;
+        nothing else is held open between writes
+        """
+        if self.flusher is not None:
+            self.flusher.close()
+            self.flusher = None
+        self.roster.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+
+class SqliteStorage:
+    """
+    This stores the students, courses and registrations in a SQLite database in WAL mode
+    """
+
+    def __init__(self, database_path):
+        """
+        :param database_path: The path to the SQLite database, which is created if it does not exist
+        """
+        # The server saves changes from its writer thread
+        self.connection = sqlite3.connect(database_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def load(self):
+        """
+        This reads the students, courses and registrations
+        :return: A tuple of (students, courses, registrations) in the shape the read functions return
+        """
+        registrations = [registration for operation, registration in self.iter_registration_changes()
+                         if operation == "+"]
+        return self.read_students(), self.read_courses(), registrations
+
+    def read_students(self):
+        """
+        :return: The list of Student records
+        """
+        return [Student(*row) for row in self.connection.execute(
+            "SELECT student_id, last_name, first_name FROM students ORDER BY rowid")]
+
+    def read_courses(self):
+        """
+        :return: The list of Course records
+        """
+        return [Course(*row) for row in self.connection.execute(
+            "SELECT course_id, course_code, course_name, credit_hours, day, time, instructor FROM courses")]
+
+    def courses_version(self):
+        """
+        This returns a value that changes whenever another connection changes the database, e.g. when the courses
+        are imported again
+        :return: The data version of the database
+        """
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def iter_registration_changes(self):
+        """
+        This streams the registrations table followed by the waitlist table
+        :return: A generator of (operation, Registration), where operation is '+' for a registration and 'w' for a
+        student waiting, in waitlist order
+        """
+        for row in self.connection.execute("SELECT student_id, course_id FROM registrations ORDER BY rowid"):
+            yield "+", Registration(*row)
+        for row in self.connection.execute("SELECT student_id, course_id FROM waitlist ORDER BY position"):
+            yield "w", Registration(*row)
+
+    def save_student(self, registry, student):
+        """
+        This inserts a new student
+        :param registry: This is the registry holding the students
+        :param student: This is the student row that was added
+        """
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO students VALUES (?, ?, ?)",
+                                    (student.student_id, student.last_name, student.first_name))
+
+    def save_registration(self, registry, operation, student_id, course_id):
+        """
+        This inserts or deletes a single registration or waitlist entry in its own transaction
+        :param registry: This is the registry holding the registrations
+        :param operation: This is '+' for a registration, '-' for a drop, 'w' for joining a waitlist and 'x' for
+        leaving one
+        :param student_id: This is the student id
+        :param course_id: This is the course id
+        """
+        with self.connection:
+            self.apply(operation, student_id, course_id)
+
+    def save_registrations(self, registry, changes):
+        """
+        This saves a batch of registers and drops in one transaction
+        :param registry: This is the registry holding the registrations
+        :param changes: This is the list of (operation, student_id, course_id) that were applied
+        """
+        self.append_registrations(changes)
+
+    def append_registrations(self, changes):
+        """
+        This saves a batch of registers and drops in one transaction; the database is never compacted
+        :param changes: This is the list of (operation, student_id, course_id) that were applied
+        :return: False
+        """
+        with self.connection:
+            # The changes are applied in order, so a drop followed by a re-register of the same course is kept
+            for operation, student_id, course_id in changes:
+                self.apply(operation, student_id, course_id)
+        return False
+
+    def apply(self, operation, student_id, course_id):
+        """
+        This applies one change inside the caller's transaction
+        :param operation: This is '+' for a registration, '-' for a drop, 'w' for joining a waitlist and 'x' for
+        leaving one
+        :param student_id: This is the student id
+        :param course_id: This is the course id
+        """
+        if operation == "+":
+            self.connection.execute("INSERT OR IGNORE INTO registrations VALUES (?, ?)", (student_id, course_id))
+        elif operation == "-":
+            self.connection.execute("DELETE FROM registrations WHERE student_id = ? AND course_id = ?",
+                                    (student_id, course_id))
+        elif operation == "w":
+            self.connection.execute("INSERT INTO waitlist (student_id, course_id) VALUES (?, ?)",
+                                    (student_id, course_id))
+        else:
+            self.connection.execute("DELETE FROM waitlist WHERE student_id = ? AND course_id = ?",
+                                    (student_id, course_id))
+
+    def import_rows(self, students, courses, registrations, waitlist=()):
+        """
+        This replaces the contents of the database with the given rows in one transaction
+        :param students: This is the list of the students
+        :param courses: This is the list of the courses
+        :param registrations: This is the list of registration records
+        :param waitlist: This is the list of registration records of the students waiting, in waitlist order
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM students")
+            self.connection.execute("DELETE FROM courses")
+            self.connection.execute("DELETE FROM registrations")
+            self.connection.execute("DELETE FROM waitlist")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO students VALUES (?, ?, ?)",
+                ((student.student_id, student.last_name, student.first_name) for student in students))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO courses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((course.course_id, course.course_code, course.course_name, course.credit_hours, course.day,
+                  course.time, course.instructor) for course in courses))
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO registrations VALUES (?, ?)",
+                ((registration.student_id, registration.course_id) for registration in registrations))
+            self.connection.executemany(
+                "INSERT INTO waitlist (student_id, course_id) VALUES (?, ?)",
+                ((registration.student_id, registration.course_id) for registration in waitlist))
+
+    def close(self):
+        """
+        This closes the database connection
+        """
+        self.connection.close()
+
+
+def open_storage(database_path=None, sync_every=SYNC_EVERY, flush_window=FLUSH_WINDOW):
+    """
+    This opens the storage backend
+    :param database_path: The path to a SQLite database, or None to use the csv files
+    :param sync_every: This is the number of new students between fsyncs of the students csv file
+    :param flush_window: This is the number of seconds changes to the csv files are gathered for before they are
+    written, or None to write every change as it is saved
+    :return: The storage backend
+    """
+    if database_path is None:
+        return CsvStorage(sync_every=sync_every, flush_window=flush_window)
+    return SqliteStorage(database_path)
+
+
+def import_csv(database_path, source=None):
+    """
+    This copies the students, courses and registrations from the csv files into a SQLite database
+    :param database_path: The path to the SQLite database
+    :param source: This is the CsvStorage to read from
+    :return: A tuple of the number of (students, courses, registrations) imported
+    """
+    # The registry replays the journal, including the waitlist changes, on top of the csv files
+    registry = Registry.from_storage(source or CsvStorage())
+    registrations = registry.registrations
+    storage = SqliteStorage(database_path)
+    try:
+        storage.import_rows(registry.students, registry.courses, registrations, registry.waitlist_rows)
+    finally:
+        storage.close()
+    return len(registry.students), len(registry.courses), len(registrations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import the csv files into a SQLite database")
+    parser.add_argument("database", help="path to the SQLite database to create or replace")
+    parser.add_argument("--students", default=data_utils.FILENAME)
+    parser.add_argument("--courses", default=data_utils.COURSES_FILENAME)
+    parser.add_argument("--registrations", default=data_utils.REGISTRATION_FILENAME)
+    args = parser.parse_args()
+    counts = import_csv(args.database, CsvStorage(args.students, args.courses, args.registrations))
+    print(f"Imported {counts[0]} students, {counts[1]} courses and {counts[2]} registrations into {args.database}.")
+
+
+if __name__ == "__main__":
+    main()